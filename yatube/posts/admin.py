@@ -1,8 +1,114 @@
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from .models import Post, Group, Comment, Follow
+from .counters import estimated_count
+from .pagination import CursorPaginator
+from . import search
 
+CURSOR_VAR = "cursor"
 
-class PostAdmin(admin.ModelAdmin):
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist walked with a `CursorPaginator` instead of page numbers.
+
+    The list is always ordered by the `keyset` of the model admin,
+    so a slice is read from an index however deep it is. Instead of
+    the two exact counts, the unfiltered list shows the estimate
+    of `counters.estimated_count` and a filtered one is counted up to
+    `ADMIN_COUNT_LIMIT` rows.
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filter and search links start over from the newest rows
+        remove = [*(remove or ()), CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def get_results(self, request):
+        paginator = CursorPaginator(
+            self.queryset,
+            self.list_per_page,
+            keys=self.model_admin.keyset,
+        )
+        page = paginator.get_page(request.GET.get(CURSOR_VAR))
+        self.result_list = page.object_list
+
+        self.result_count_estimated = False
+        self.result_count_capped = False
+        if self.get_filters_params() or self.query:
+            limit = settings.ADMIN_COUNT_LIMIT
+            self.result_count = self.queryset[: limit + 1].count()
+            if self.result_count > limit:
+                self.result_count = limit
+                self.result_count_capped = True
+        else:
+            self.result_count = max(
+                estimated_count(self.model), len(self.result_list)
+            )
+            self.result_count_estimated = True
+
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = page.has_other_pages()
+        self.paginator = paginator
+        self.page = page
+        self.previous_url = self.next_url = None
+        if page.has_previous():
+            self.previous_url = self.get_query_string(
+                {CURSOR_VAR: page.previous_cursor}
+            )
+        if page.has_next():
+            self.next_url = self.get_query_string(
+                {CURSOR_VAR: page.next_cursor}
+            )
+
+
+class LargeTableAdminMixin:
+    """
+    Keeps the changelist of a table with tens of millions of rows fast:
+    related objects are joined, rows are paged by `keyset` with
+    `KeysetChangeList` and counts come from the table statistics.
+    The first field of `keyset` should be indexed, so that the date
+    filters on it read a range of the same index.
+    """
+
+    keyset = ("id",)
+    change_list_template = "admin/posts/keyset_change_list.html"
+    show_full_result_count = False
+    # Sorting by another column would sort the whole table
+    sortable_by = ()
+
+    def get_ordering(self, request):
+        return ["-" + name for name in self.keyset]
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
+class IndexedSearchMixin:
+    """
+    Searches the changelist through the full-text index
+    instead of `LIKE '%term%'` scans over `search_fields`.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        pks = search.backend.search(
+            self.model, search_term, limit=settings.SEARCH_ADMIN_LIMIT
+        )
+        return queryset.filter(pk__in=pks), False
+
+
+class PostAdmin(LargeTableAdminMixin, IndexedSearchMixin, admin.ModelAdmin):
     list_display = (
         "pk",
         "text",
@@ -10,6 +116,8 @@ class PostAdmin(admin.ModelAdmin):
         "author",
         "group",
     )
+    list_select_related = ("author", "group")
+    keyset = ("pub_date", "id")
     search_fields = ("text",)
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
@@ -20,8 +128,10 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = "-пусто-"
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdminMixin, IndexedSearchMixin, admin.ModelAdmin):
     list_display = ("pk", "text", "created", "post", "author")
+    list_select_related = ("post", "author")
+    keyset = ("created", "id")
     search_fields = ("text",)
     list_filter = ("created",)
     empty_value_display = "-пусто-"
@@ -0,0 +1,163 @@
+"""
+Read-only JSON API mirroring the post feeds and pages.
+
+Feeds are cursor-paginated like the HTML ones and streamed item by item,
+so a big page is never serialized into one string. Conditional GET
+works the same way as for the pages.
+"""
+
+import functools
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_GET
+from yatube.routers import use_replica
+
+from . import conditional, thumbnails
+from .counters import profile_for
+from .models import Group, Post
+from .pagination import CursorPaginator
+from .timeline import TimelinePaginator
+
+User = get_user_model()
+
+THUMBNAIL_GEOMETRY = "960x339"
+
+
+def _posts():
+    return (
+        Post.objects.select_related("author")
+        .select_related("group")
+        .only(
+            "id",
+            "text",
+            "pub_date",
+            "image",
+            "comment_count",
+            "author__username",
+            "group__slug",
+        )
+    )
+
+
+def post_json(post):
+    thumbnail = thumbnails.existing_thumbnail(post.image, THUMBNAIL_GEOMETRY)
+    return {
+        "id": post.id,
+        "text": post.text,
+        "pub_date": post.pub_date.isoformat(),
+        "author": post.author.username,
+        "group": post.group.slug if post.group_id is not None else None,
+        "thumbnail": thumbnail.url if thumbnail is not None else None,
+        "comment_count": post.comment_count,
+    }
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _page_size(request):
+    try:
+        size = int(request.GET.get("limit", settings.API_PAGE_SIZE))
+    except ValueError:
+        size = settings.API_PAGE_SIZE
+    return min(max(size, 1), settings.API_MAX_PAGE_SIZE)
+
+
+def _stream(page):
+    yield '{"results": ['
+    for number, post in enumerate(page):
+        yield ("," if number else "") + _dumps(post_json(post))
+    yield '], "next": %s, "previous": %s}' % (
+        _dumps(page.next_cursor),
+        _dumps(page.previous_cursor),
+    )
+
+
+def _feed(request, paginator):
+    page = paginator.get_page(request.GET.get("cursor"))
+    # The slice is read before the response starts,
+    # only the serialization is streamed.
+    page.object_list
+    return StreamingHttpResponse(
+        _stream(page), content_type="application/json"
+    )
+
+
+def _error(detail, status):
+    return JsonResponse({"detail": detail}, status=status)
+
+
+def api_login_required(view):
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error("Authentication required", 401)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+@use_replica
+@require_GET
+@condition(etag_func=conditional.index_etag)
+def index(request):
+    return _feed(request, CursorPaginator(_posts(), _page_size(request)))
+
+
+@use_replica
+@require_GET
+@condition(etag_func=conditional.group_etag)
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return _error("Group not found", 404)
+    posts = _posts().filter(group=group)
+    return _feed(request, CursorPaginator(posts, _page_size(request)))
+
+
+@use_replica
+@require_GET
+@condition(etag_func=conditional.profile_etag)
+def profile(request, username):
+    author = User.objects.filter(username=username).first()
+    if author is None:
+        return _error("User not found", 404)
+    posts = _posts().filter(author=author)
+    return _feed(request, CursorPaginator(posts, _page_size(request)))
+
+
+@use_replica
+@require_GET
+@api_login_required
+@condition(etag_func=conditional.follow_etag)
+def follow_index(request):
+    paginator = TimelinePaginator(request.user, _page_size(request))
+    return _feed(request, paginator)
+
+
+@use_replica
+@require_GET
+@condition(etag_func=conditional.post_etag)
+def post_view(request, username, post_id):
+    # Unlike first(), get() does not sort the single row by id
+    try:
+        post = _posts().get(author__username=username, id=post_id)
+    except Post.DoesNotExist:
+        return _error("Post not found", 404)
+    profile = profile_for(post.author)
+    return JsonResponse(
+        {
+            "post": post_json(post),
+            "author": {
+                "username": post.author.username,
+                "posts_count": profile.posts_count,
+                "followers_count": profile.followers_count,
+                "following_count": profile.following_count,
+            },
+        },
+        json_dumps_params={"ensure_ascii": False},
+    )
@@ -3,3 +3,14 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = "posts"
+
+    def ready(self):
+        from yatube import checks  # noqa: F401
+
+        from . import (  # noqa: F401
+            counters,
+            feed_cache,
+            recommendations,
+            search,
+            timeline,
+        )
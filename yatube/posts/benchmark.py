@@ -0,0 +1,213 @@
+"""
+Benchmark of every route of `posts.urls` through the WSGI application.
+
+Requests go through the whole middleware stack, like real ones.
+They run in a transaction that is rolled back at the end, so routes
+with side effects (following an author) leave no trace.
+"""
+
+import io
+import math
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY,
+    HASH_SESSION_KEY,
+    SESSION_KEY,
+    get_user_model,
+)
+from django.core import signals
+from django.db import close_old_connections, connection, transaction
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from posts import urls
+from posts.models import Follow, Group, Post, Profile
+
+User = get_user_model()
+
+
+class NotEnoughData(Exception):
+    pass
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of a non-empty list.
+    """
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def sample_kwargs():
+    """
+    Picks URL arguments touching the hot paths: the newest post
+    of the most followed author and a group with posts.
+    """
+    profile = Profile.objects.order_by("-followers_count").first()
+    post = (
+        Post.objects.filter(author_id=profile.user_id).first()
+        if profile is not None
+        else None
+    )
+    if post is None:
+        raise NotEnoughData("No posts to benchmark, see generate_load_data")
+    group = Group.objects.filter(posts__isnull=False).first()
+    if group is None:
+        raise NotEnoughData("No group has posts, see generate_load_data")
+    return {
+        "username": post.author.username,
+        "post_id": post.id,
+        "slug": group.slug,
+        # A word of the post to search for
+        "query": (post.text.split() or ["привет"])[0],
+    }
+
+
+def sample_viewer(author_username):
+    """
+    Picks a follower of the sampled author, or any other user.
+    """
+    follow = (
+        Follow.objects.filter(author__username=author_username)
+        .select_related("user")
+        .first()
+    )
+    if follow is not None:
+        return follow.user
+    viewer = User.objects.exclude(username=author_username).first()
+    if viewer is None:
+        raise NotEnoughData("Another user is needed to benchmark as")
+    return viewer
+
+
+def session_cookie(user):
+    """
+    Logs `user` in the way `django.test.Client.force_login` does.
+    """
+    engine = import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return f"{settings.SESSION_COOKIE_NAME}={session.session_key}"
+
+
+def routes(kwargs):
+    """
+    Returns `(name, path)` of every route of `posts.urls`.
+    """
+    result = []
+    for pattern in urls.urlpatterns:
+        path = reverse(
+            pattern.name,
+            kwargs={name: kwargs[name] for name in pattern.pattern.converters},
+        )
+        if pattern.name == "search":
+            path += "?" + urlencode({"q": kwargs["query"]})
+        result.append((pattern.name, path))
+    return result
+
+
+def environ(path, cookie):
+    path, _, query = path.partition("?")
+    return {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SCRIPT_NAME": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "localhost",
+        "HTTP_COOKIE": cookie,
+        "REMOTE_ADDR": "127.0.0.1",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": io.StringIO(),
+        "wsgi.multithread": False,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+
+
+def call(application, path, cookie):
+    """
+    Returns the status, the body size and the number of queries.
+    """
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(int(status.split()[0]))
+
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        response = application(environ(path, cookie), start_response)
+        try:
+            size = sum(len(chunk) for chunk in response)
+        finally:
+            if hasattr(response, "close"):
+                response.close()
+    return statuses[0], size, counter.count
+
+
+def run(application, repeat=20, warmup=2, anonymous=False):
+    """
+    Requests every route `warmup + repeat` times, round-robin,
+    and returns the measurements of every route.
+    """
+    # Connections are closed at the end of every request,
+    # which would break the enclosing transaction.
+    signals.request_started.disconnect(close_old_connections)
+    signals.request_finished.disconnect(close_old_connections)
+    try:
+        with transaction.atomic():
+            kwargs = sample_kwargs()
+            cookie = ""
+            viewer = None
+            if not anonymous:
+                viewer = sample_viewer(kwargs["username"])
+                cookie = session_cookie(viewer)
+            paths = routes(kwargs)
+            timings = {name: [] for name, _ in paths}
+            results = {}
+            for round_number in range(warmup + repeat):
+                for name, path in paths:
+                    started = time.perf_counter()
+                    status, size, queries = call(application, path, cookie)
+                    elapsed = time.perf_counter() - started
+                    if round_number >= warmup:
+                        timings[name].append(elapsed)
+                    results[name] = {
+                        "path": path,
+                        "status": status,
+                        "queries": queries,
+                        "bytes": size,
+                    }
+            transaction.set_rollback(True)
+    finally:
+        signals.request_started.connect(close_old_connections)
+        signals.request_finished.connect(close_old_connections)
+
+    for name, result in results.items():
+        result["p50_ms"] = round(percentile(timings[name], 50) * 1000, 2)
+        result["p95_ms"] = round(percentile(timings[name], 95) * 1000, 2)
+    return {
+        "viewer": viewer.username if viewer is not None else None,
+        "repeat": repeat,
+        "routes": results,
+    }
@@ -0,0 +1,55 @@
+"""
+Helpers for writing rows in bulk.
+
+`bulk_create` sends no signals, so callers have to bring
+the denormalized data up to date with `refresh_derived_data`.
+"""
+
+from contextlib import contextmanager
+
+from django.db import connection
+
+from . import counters, feed_cache, search, timeline
+
+
+@contextmanager
+def explicit_dates(model, *field_names):
+    """
+    Lets `bulk_create` keep the given values of `auto_now_add` fields
+    of `model` instead of stamping every row with the current time.
+    """
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def refresh_derived_data(stdout=None):
+    """
+    Recomputes everything the signals maintain for single writes:
+    counters, profiles, group summaries, timelines, the search index
+    and cached fragments.
+    Table statistics are gathered again too.
+    """
+
+    def report(message):
+        if stdout is not None:
+            stdout.write(message)
+
+    report(f"comment counters: {counters.reconcile_comment_counts()} fixed")
+    report(f"user counters: {counters.reconcile_user_counters()} fixed")
+    report(f"group summaries: {counters.reconcile_group_stats()} fixed")
+    report(f"timelines: {timeline.rebuild()} entries")
+    for model in search.INDEXED_MODELS:
+        report(f"search index of {model._meta.label}: {search.rebuild(model)}")
+    # Bulk writes bumped no fragment versions.
+    feed_cache.fragment_cache().clear()
+    # The admin estimates table sizes from the statistics
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    report("table statistics: analyzed")
@@ -0,0 +1,81 @@
+"""
+Validators for conditional GET of the post pages.
+
+ETags are built from the feed cache versions the page depends on,
+so they change with every write that affects the page, and from
+the viewer, whose pages differ. No Last-Modified is sent: the dates
+of the shown posts do not move on edits, new comments or deletions,
+and a date to the second would miss writes made within that second.
+"""
+
+import hashlib
+
+from django.contrib.auth import get_user_model
+
+from . import feed_cache
+from .models import Group, Post
+from .timeline import exempt_authors_followed_by
+
+User = get_user_model()
+
+
+def _etag(request, *scopes):
+    raw = "|".join(
+        [
+            request.get_full_path(),
+            str(request.user.pk),
+            feed_cache.versions(*scopes),
+        ]
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def index_etag(request):
+    return _etag(request, feed_cache.SITE)
+
+
+def group_etag(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list("id").first()
+    if group_id is None:
+        return None
+    return _etag(request, feed_cache.group_scope(group_id[0]))
+
+
+def profile_etag(request, username):
+    author_id = User.objects.filter(username=username).values_list("id")
+    author_id = author_id.first()
+    if author_id is None:
+        return None
+    return _etag(
+        request,
+        feed_cache.author_scope(author_id[0]),
+        feed_cache.follower_scope(author_id[0]),
+        feed_cache.follower_scope(request.user.pk),
+    )
+
+
+def post_etag(request, username, post_id):
+    author_id = (
+        Post.objects.filter(id=post_id, author__username=username)
+        .values_list("author_id")
+        .first()
+    )
+    if author_id is None:
+        return None
+    return _etag(
+        request,
+        feed_cache.post_scope(post_id),
+        feed_cache.author_scope(author_id[0]),
+        feed_cache.follower_scope(author_id[0]),
+        feed_cache.follower_scope(request.user.pk),
+    )
+
+
+def follow_etag(request):
+    return _etag(
+        request,
+        feed_cache.follower_scope(request.user.pk),
+        *map(
+            feed_cache.author_scope, exempt_authors_followed_by(request.user)
+        ),
+    )
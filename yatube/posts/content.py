@@ -0,0 +1,338 @@
+"""
+Export and import of the site content as JSON lines.
+
+Every line is one row: `{"model": "posts.post", ...}`. Users are
+referenced by username and groups by slug, so a dump can be loaded
+into a database with other primary keys for them. Posts and comments
+keep their ids, comments point at them. A post is told apart by its
+author and date: one whose id holds another post of the target
+database is refused with its comments, one edited since is updated.
+"""
+
+import itertools
+import json
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from .bulk import explicit_dates
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+CHUNK_SIZE = 2000
+# Batches are looked up with `IN (...)`, SQLite takes up to 999 parameters.
+BATCH_SIZE = 400
+
+# Ordered so that every row comes after the rows it points at.
+EXPORTS = (
+    (Group, ("slug", "title", "description"), {}),
+    (
+        Post,
+        (
+            "id",
+            "text",
+            "pub_date",
+            "author",
+            "group",
+            "image",
+            "image_width",
+            "image_height",
+            "image_size",
+        ),
+        {"author": "author__username", "group": "group__slug"},
+    ),
+    (
+        Comment,
+        ("id", "post", "author", "text", "created"),
+        {"post": "post_id", "author": "author__username"},
+    ),
+    (
+        Follow,
+        ("user", "author"),
+        {"user": "user__username", "author": "author__username"},
+    ),
+)
+
+
+# Fields of a post that can change after it is written
+UPDATED_FIELDS = (
+    "text",
+    "group_id",
+    "image",
+    "image_width",
+    "image_height",
+    "image_size",
+)
+
+
+class ContentError(Exception):
+    pass
+
+
+def _rows(model, fields, lookups, chunk_size):
+    columns = [lookups.get(field, field) for field in fields]
+    last_pk = 0
+    while True:
+        chunk = list(
+            model.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", *columns)[:chunk_size]
+        )
+        if not chunk:
+            return
+        for _, *values in chunk:
+            yield dict(zip(fields, values))
+        last_pk = chunk[-1][0]
+
+
+def export_lines(chunk_size=CHUNK_SIZE):
+    """
+    Yields the content as JSON lines, reading it in chunks
+    of primary keys so memory use does not grow with the tables.
+    """
+    for model, fields, lookups in EXPORTS:
+        label = model._meta.label_lower
+        for row in _rows(model, fields, lookups, chunk_size):
+            line = {"model": label, **row}
+            yield json.dumps(line, ensure_ascii=False, default=str) + "\n"
+
+
+class Importer:
+    """
+    Loads JSON lines with `bulk_create`, one transaction per batch.
+
+    Rows already present (same id, slug or follow pair) are kept,
+    so an interrupted import can be run again. `bulk_create` sends no
+    signals: derived data has to be refreshed afterwards.
+
+    Per model label, `imported` counts the inserted rows, `updated`
+    the posts edited since they were dumped, `present` the other rows
+    found already stored, `conflicting` the posts whose id is taken
+    by another post and `skipped` the rows pointing at unknown users
+    or posts.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, create_users=False):
+        self.batch_size = batch_size
+        self.create_users = create_users
+        self.user_ids = {}
+        self.group_ids = {}
+        # Exported ids of the posts that are stored as they were dumped
+        self.post_ids = set()
+        self.imported = {}
+        self.updated = {}
+        self.present = {}
+        self.conflicting = {}
+        self.skipped = {}
+
+    def load(self, lines):
+        rows = (json.loads(line) for line in lines if line.strip())
+        for label, batches in itertools.groupby(rows, self._label):
+            while True:
+                batch = list(itertools.islice(batches, self.batch_size))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    self._load_batch(label, batch)
+        self._reset_sequences()
+
+    @staticmethod
+    def _label(row):
+        return row.get("model")
+
+    def _load_batch(self, label, rows):
+        loaders = {
+            "posts.group": self._groups,
+            "posts.post": self._posts,
+            "posts.comment": self._comments,
+            "posts.follow": self._follows,
+        }
+        if label not in loaders:
+            raise ContentError(f"Unknown model {label!r}")
+        model, objects = loaders[label](rows)
+        resolved = len(objects)
+        updated = 0
+        if model is Post:
+            objects, updated = self._without_conflicts(objects)
+        before = self._stored(model, objects)
+        with explicit_dates(Post, "pub_date"), explicit_dates(
+            Comment, "created"
+        ):
+            model.objects.bulk_create(objects, ignore_conflicts=True)
+        # Conflicting rows are ignored, only a count tells what was written
+        inserted = self._stored(model, objects) - before
+        for counts, count in (
+            (self.imported, inserted),
+            (self.updated, updated),
+            (self.present, len(objects) - inserted - updated),
+            (self.conflicting, resolved - len(objects)),
+            (self.skipped, len(rows) - resolved),
+        ):
+            counts[label] = counts.get(label, 0) + count
+
+    @staticmethod
+    def _stored(model, objects):
+        """
+        Returns how many of `objects` are in the database.
+        """
+        if not objects:
+            return 0
+        if model is Group:
+            slugs = [group.slug for group in objects]
+            return Group.objects.filter(slug__in=slugs).count()
+        if model is Follow:
+            pairs = {(follow.user_id, follow.author_id) for follow in objects}
+            stored = Follow.objects.filter(
+                user_id__in={user_id for user_id, _ in pairs},
+                author_id__in={author_id for _, author_id in pairs},
+            ).values_list("user_id", "author_id")
+            return len(pairs.intersection(stored))
+        pks = [instance.pk for instance in objects]
+        return model.objects.filter(pk__in=pks).count()
+
+    def _without_conflicts(self, posts):
+        """
+        Returns the posts whose id is free or holds the same post,
+        by the same author at the same date, and how many of the stored
+        ones were edited since and got the dumped values. Remembers
+        the ids of the returned posts for the comments to point at.
+        """
+        stored = {
+            values[0]: values[1:]
+            for values in Post.objects.filter(
+                pk__in=[post.pk for post in posts]
+            ).values_list("pk", "author_id", "pub_date", *UPDATED_FIELDS)
+        }
+        kept = []
+        changed = []
+        for post in posts:
+            if post.pk not in stored:
+                kept.append(post)
+                continue
+            author_id, pub_date, *values = stored[post.pk]
+            if (author_id, pub_date) != (post.author_id, post.pub_date):
+                continue
+            kept.append(post)
+            if self._values(values) != self._values(
+                getattr(post, name) for name in UPDATED_FIELDS
+            ):
+                changed.append(post)
+        if changed:
+            Post.objects.bulk_update(changed, UPDATED_FIELDS)
+        self.post_ids.update(post.pk for post in kept)
+        return kept, len(changed)
+
+    @staticmethod
+    def _values(values):
+        # A stored image is a name, an instance one is a file
+        return [
+            getattr(value, "name", value) or None if name == "image" else value
+            for name, value in zip(UPDATED_FIELDS, values)
+        ]
+
+    def _resolve_users(self, usernames):
+        missing = set(usernames) - self.user_ids.keys()
+        if missing and self.create_users:
+            User.objects.bulk_create(
+                [
+                    User(username=username, password=make_password(None))
+                    for username in missing
+                ],
+                ignore_conflicts=True,
+            )
+        missing = sorted(missing)
+        for start in range(0, len(missing), BATCH_SIZE):
+            self.user_ids.update(
+                User.objects.filter(
+                    username__in=missing[start : start + BATCH_SIZE]
+                ).values_list("username", "id")
+            )
+
+    def _groups(self, rows):
+        objects = [
+            Group(
+                slug=row["slug"],
+                title=row["title"],
+                description=row["description"],
+            )
+            for row in rows
+        ]
+        return Group, objects
+
+    def _resolve_groups(self, slugs):
+        missing = set(slugs) - self.group_ids.keys() - {None}
+        if missing:
+            self.group_ids.update(
+                Group.objects.filter(slug__in=missing).values_list(
+                    "slug", "id"
+                )
+            )
+
+    def _posts(self, rows):
+        self._resolve_users(row["author"] for row in rows)
+        self._resolve_groups(row["group"] for row in rows)
+        objects = [
+            Post(
+                id=row["id"],
+                text=row["text"],
+                pub_date=parse_datetime(row["pub_date"]),
+                author_id=self.user_ids[row["author"]],
+                group_id=self.group_ids.get(row["group"]),
+                image=row["image"] or None,
+                image_width=row.get("image_width"),
+                image_height=row.get("image_height"),
+                image_size=row.get("image_size"),
+            )
+            for row in rows
+            if row["author"] in self.user_ids
+        ]
+        return Post, objects
+
+    def _comments(self, rows):
+        self._resolve_users(row["author"] for row in rows)
+        # Only posts of the dump, an id taken by another post
+        # would attach the comment to it
+        post_ids = self.post_ids
+        objects = [
+            Comment(
+                id=row["id"],
+                text=row["text"],
+                created=parse_datetime(row["created"]),
+                post_id=row["post"],
+                author_id=self.user_ids[row["author"]],
+            )
+            for row in rows
+            if row["author"] in self.user_ids and row["post"] in post_ids
+        ]
+        return Comment, objects
+
+    def _follows(self, rows):
+        self._resolve_users(
+            itertools.chain.from_iterable(
+                (row["user"], row["author"]) for row in rows
+            )
+        )
+        objects = [
+            Follow(
+                user_id=self.user_ids[row["user"]],
+                author_id=self.user_ids[row["author"]],
+            )
+            for row in rows
+            if row["user"] in self.user_ids and row["author"] in self.user_ids
+        ]
+        return Follow, objects
+
+    def _reset_sequences(self):
+        # Rows were written with explicit ids, which leaves
+        # the sequences behind on backends that have them.
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [Group, Post, Comment, Follow]
+        )
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
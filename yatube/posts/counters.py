@@ -0,0 +1,370 @@
+"""
+Denormalized counters kept in sync by model signals,
+and approximate counts for what is too big to count on a request.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError, connections, router
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Comment, Follow, Group, GroupStats, Post, Profile
+
+User = get_user_model()
+
+CHUNK_SIZE = 10000
+
+RECENT_CONTRIBUTORS = 5
+# How many of the newest posts of a group are looked through
+# for its recent contributors.
+RECENT_SCAN = 200
+
+COUNT_PREFIX = "approximate-count:"
+
+
+def _count(model, field):
+    """
+    Correlated subquery counting `model` rows pointing at the outer row.
+    """
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("id"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def _user_counts():
+    return {
+        "followers_count": _count(Follow, "author"),
+        "following_count": _count(Follow, "user"),
+        "posts_count": _count(Post, "author"),
+    }
+
+
+def _pk_chunks(queryset, chunk_size):
+    """
+    Splits `queryset` into primary key ranges of `chunk_size` rows.
+    """
+    last_pk = 0
+    while True:
+        pks = list(
+            queryset.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:chunk_size]
+        )
+        if not pks:
+            return
+        yield queryset.filter(pk__gt=last_pk, pk__lte=pks[-1])
+        last_pk = pks[-1]
+
+
+def reconcile_comment_counts(chunk_size=CHUNK_SIZE):
+    """
+    Recounts comments of every post, walking the table in primary key
+    ranges. Only drifted rows are written. Returns their number.
+    """
+    fixed = 0
+    for chunk in _pk_chunks(Post.objects.all(), chunk_size):
+        drifted = [
+            Post(pk=pk, comment_count=actual)
+            for pk, actual in chunk.annotate(actual=_count(Comment, "post"))
+            .exclude(comment_count=F("actual"))
+            .values_list("pk", "actual")
+        ]
+        Post.objects.bulk_update(drifted, ["comment_count"])
+        fixed += len(drifted)
+    return fixed
+
+
+def reconcile_user_counters(chunk_size=CHUNK_SIZE):
+    """
+    Recounts followers, followings and posts of every user, creating
+    missing profiles. Returns the number of written profiles.
+    """
+    fields = list(_user_counts())
+    fixed = 0
+    for chunk in _pk_chunks(User.objects.all(), chunk_size):
+        actual = chunk.annotate(**_user_counts()).values_list("pk", *fields)
+        stored = {
+            profile.user_id: profile
+            for profile in Profile.objects.filter(user__in=chunk)
+        }
+        missing, drifted = [], []
+        for pk, *counts in actual:
+            values = dict(zip(fields, counts))
+            profile = stored.get(pk)
+            if profile is None:
+                missing.append(Profile(user_id=pk, **values))
+            elif any(getattr(profile, f) != v for f, v in values.items()):
+                drifted.append(Profile(user_id=pk, **values))
+        Profile.objects.bulk_create(missing)
+        Profile.objects.bulk_update(drifted, fields)
+        fixed += len(missing) + len(drifted)
+    return fixed
+
+
+def _recent_activity(group_id):
+    """
+    Returns the date of the newest post of a group
+    and the ids of its latest distinct authors.
+    """
+    rows = list(
+        Post.objects.filter(group_id=group_id)
+        .order_by("-pub_date", "-id")
+        .values_list("author_id", "pub_date")[:RECENT_SCAN]
+    )
+    if not rows:
+        return None, ""
+    authors = list(dict.fromkeys(author_id for author_id, _ in rows))
+    return rows[0][1], _join(authors[:RECENT_CONTRIBUTORS])
+
+
+def _join(ids):
+    return ",".join(map(str, ids))
+
+
+def reconcile_group_stats(chunk_size=CHUNK_SIZE):
+    """
+    Recounts posts of every group and looks up their latest activity,
+    creating missing summaries. Returns the number of written summaries.
+    """
+    fields = ["posts_count", "last_post_at", "recent_contributors"]
+    fixed = 0
+    for chunk in _pk_chunks(Group.objects.all(), chunk_size):
+        actual = chunk.annotate(posts_count=_count(Post, "group"))
+        stored = {
+            stats.group_id: stats
+            for stats in GroupStats.objects.filter(group__in=chunk)
+        }
+        missing, drifted = [], []
+        for pk, posts_count in actual.values_list("pk", "posts_count"):
+            last_post_at, contributors = _recent_activity(pk)
+            stats = GroupStats(
+                group_id=pk,
+                posts_count=posts_count,
+                last_post_at=last_post_at,
+                recent_contributors=contributors,
+            )
+            current = stored.get(pk)
+            if current is None:
+                missing.append(stats)
+            elif any(getattr(current, f) != getattr(stats, f) for f in fields):
+                drifted.append(stats)
+        GroupStats.objects.bulk_create(missing)
+        GroupStats.objects.bulk_update(drifted, fields)
+        fixed += len(missing) + len(drifted)
+    return fixed
+
+
+def group_stats_for(group):
+    """
+    Returns the summary of `group`, computing it once if it is missing.
+    """
+    try:
+        return GroupStats.objects.get(group=group)
+    except GroupStats.DoesNotExist:
+        last_post_at, contributors = _recent_activity(group.pk)
+        stats, _ = GroupStats.objects.get_or_create(
+            group=group,
+            defaults={
+                "posts_count": Post.objects.filter(group=group).count(),
+                "last_post_at": last_post_at,
+                "recent_contributors": contributors,
+            },
+        )
+        return stats
+
+
+def profile_for(user):
+    """
+    Returns counters of `user`, counting them once if they are missing.
+    """
+    try:
+        return Profile.objects.get(user=user)
+    except Profile.DoesNotExist:
+        counts = (
+            User.objects.filter(pk=user.pk)
+            .annotate(**_user_counts())
+            .values(*_user_counts())
+            .get()
+        )
+        profile, _ = Profile.objects.get_or_create(user=user, defaults=counts)
+        return profile
+
+
+def estimated_count(model):
+    """
+    Returns the number of rows of `model` according to the table
+    statistics, without scanning the table.
+    """
+    connection = connections[router.db_for_read(model)]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        try:
+            if connection.vendor == "sqlite":
+                # Refreshed by ANALYZE, the first number of an index
+                # entry is the number of rows it covers.
+                cursor.execute(
+                    "SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table]
+                )
+                rows = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+                if rows:
+                    return max(rows)
+            elif connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class "
+                    "WHERE oid = %s::regclass",
+                    [table],
+                )
+                row = cursor.fetchone()
+                if row and row[0] >= 0:
+                    return row[0]
+        except DatabaseError:
+            # No statistics were gathered yet
+            pass
+    # The greatest primary key is found in the index and bounds the count
+    last_pk = (
+        model._default_manager.order_by("-pk")
+        .values_list("pk", flat=True)
+        .first()
+    )
+    return last_pk or 0
+
+
+def approximate_count(name, compute):
+    """
+    Returns the count cached under `name`, computed with `compute`
+    at most once per `APPROXIMATE_COUNT_TIMEOUT` seconds.
+    """
+    key = COUNT_PREFIX + name
+    count = cache.get(key)
+    if count is None:
+        count = compute()
+        cache.set(key, count, settings.APPROXIMATE_COUNT_TIMEOUT)
+    return count
+
+
+def _bump(user_id, field, delta):
+    # Profiles are never created here: this also runs while a user
+    # and their profile are being deleted by a cascade.
+    profiles = Profile.objects.filter(user_id=user_id)
+    if delta < 0:
+        profiles = profiles.filter(**{f"{field}__gt": 0})
+    profiles.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(**kwargs):
+    if kwargs["created"] and not kwargs["raw"]:
+        Post.objects.filter(pk=kwargs["instance"].post_id).update(
+            comment_count=F("comment_count") + 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(**kwargs):
+    Post.objects.filter(
+        pk=kwargs["instance"].post_id, comment_count__gt=0
+    ).update(comment_count=F("comment_count") - 1)
+
+
+@receiver(post_save, sender=User)
+def create_profile(**kwargs):
+    if kwargs["created"] and not kwargs["raw"]:
+        Profile.objects.get_or_create(user=kwargs["instance"])
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(**kwargs):
+    if kwargs["created"] and not kwargs["raw"]:
+        follow = kwargs["instance"]
+        _bump(follow.author_id, "followers_count", 1)
+        _bump(follow.user_id, "following_count", 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(**kwargs):
+    follow = kwargs["instance"]
+    _bump(follow.author_id, "followers_count", -1)
+    _bump(follow.user_id, "following_count", -1)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(**kwargs):
+    if kwargs["created"] and not kwargs["raw"]:
+        _bump(kwargs["instance"].author_id, "posts_count", 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(**kwargs):
+    _bump(kwargs["instance"].author_id, "posts_count", -1)
+
+
+@receiver(post_save, sender=Group)
+def create_group_stats(**kwargs):
+    if kwargs["created"] and not kwargs["raw"]:
+        GroupStats.objects.get_or_create(group=kwargs["instance"])
+
+
+def _add_to_group(post):
+    stats = GroupStats.objects.filter(group_id=post.group_id).first()
+    if stats is None:
+        group_stats_for(post.group)
+        return
+    contributors = [post.author_id] + [
+        pk for pk in stats.contributor_ids if pk != post.author_id
+    ]
+    changes = {
+        "posts_count": F("posts_count") + 1,
+        "recent_contributors": _join(contributors[:RECENT_CONTRIBUTORS]),
+    }
+    if stats.last_post_at is None or post.pub_date >= stats.last_post_at:
+        changes["last_post_at"] = post.pub_date
+    GroupStats.objects.filter(group_id=post.group_id).update(**changes)
+
+
+def _refresh_group(group_id, delta):
+    # The post that left may have been the latest one or the only one
+    # of its author, so the activity is looked up again.
+    last_post_at, contributors = _recent_activity(group_id)
+    GroupStats.objects.filter(group_id=group_id).update(
+        posts_count=Greatest(F("posts_count") + delta, 0),
+        last_post_at=last_post_at,
+        recent_contributors=contributors,
+    )
+
+
+@receiver(post_save, sender=Post)
+def summarize_saved_post(**kwargs):
+    post = kwargs["instance"]
+    if kwargs["raw"]:
+        return
+    if kwargs["created"]:
+        if post.group_id is not None:
+            _add_to_group(post)
+        return
+    loaded = getattr(post, "_loaded_values", {})
+    if loaded.get("group_id", post.group_id) == post.group_id:
+        return
+    if loaded["group_id"] is not None:
+        _refresh_group(loaded["group_id"], -1)
+    if post.group_id is not None:
+        _refresh_group(post.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def summarize_deleted_post(**kwargs):
+    # Posts of a deleted group are set to no group by a single UPDATE
+    # without signals, the summary of the group is deleted with it.
+    post = kwargs["instance"]
+    if post.group_id is not None:
+        _refresh_group(post.group_id, -1)
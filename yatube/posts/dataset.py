@@ -0,0 +1,190 @@
+"""
+Seeded generator of a realistic dataset for load testing.
+
+Popularity follows a Zipf law: a few authors get most of the followers
+and a few posts get most of the comments, like on a real site.
+The same seed and sizes always produce the same rows.
+"""
+
+import itertools
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from .bulk import explicit_dates
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+WORDS = (
+    "привет мир сегодня завтра вчера город лес река море небо солнце "
+    "дождь снег ветер утро вечер ночь кофе чай книга фильм музыка "
+    "работа отпуск дорога поезд самолёт друзья семья кот собака "
+    "парк улица дом окно весна лето осень зима праздник ужин "
+    "python django код тест запрос база данные сервер"
+).split()
+
+# Exponents of the Zipf distributions, the higher the more skewed.
+FOLLOWER_SKEW = 1.1
+ACTIVITY_SKEW = 0.8
+COMMENT_SKEW = 1.0
+
+PASSWORD = "load-password"
+
+
+class Generator:
+    def __init__(
+        self, seed=1, prefix="load", days=365, batch_size=5000, stdout=None
+    ):
+        self.random = random.Random(seed)
+        self.prefix = prefix
+        self.days = days
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.now = timezone.now()
+
+    def report(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def zipf_weights(self, count, skew):
+        """
+        Returns cumulative weights of `count` items
+        in a random order of popularity.
+        """
+        ranks = list(range(1, count + 1))
+        self.random.shuffle(ranks)
+        return list(itertools.accumulate(1 / rank**skew for rank in ranks))
+
+    def text(self, low, high):
+        words = self.random.choices(WORDS, k=self.random.randint(low, high))
+        return " ".join(words).capitalize()
+
+    def insert(self, model, objects):
+        """
+        Writes `objects` in batches, returns the number of written rows.
+        """
+        written = 0
+        objects = iter(objects)
+        while True:
+            batch = list(itertools.islice(objects, self.batch_size))
+            if not batch:
+                return written
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            written += len(batch)
+
+    def new_pks(self, queryset, count):
+        # bulk_create does not set primary keys on every backend
+        return list(
+            queryset.order_by("-pk").values_list("pk", flat=True)[:count]
+        )[::-1]
+
+    def generate(self, users, groups, posts, follows, comments):
+        group_ids = self.generate_groups(groups)
+        user_ids = self.generate_users(users)
+        post_dates = self.generate_posts(posts, user_ids, group_ids)
+        self.generate_follows(follows, user_ids)
+        self.generate_comments(comments, user_ids, post_dates)
+
+    def generate_groups(self, count):
+        self.insert(
+            Group,
+            (
+                Group(
+                    title=f"Сообщество {self.prefix} {number}",
+                    slug=f"{self.prefix}-group-{number}",
+                    description=self.text(10, 30),
+                )
+                for number in range(count)
+            ),
+        )
+        self.report(f"groups: {count}")
+        return self.new_pks(
+            Group.objects.filter(slug__startswith=f"{self.prefix}-group-"),
+            count,
+        )
+
+    def generate_users(self, count):
+        # Hashing a password takes long, every user shares one hash.
+        password = make_password(PASSWORD)
+        self.insert(
+            User,
+            (
+                User(username=f"{self.prefix}{number}", password=password)
+                for number in range(count)
+            ),
+        )
+        self.report(f"users: {count}")
+        return self.new_pks(
+            User.objects.filter(username__startswith=self.prefix), count
+        )
+
+    def generate_posts(self, count, user_ids, group_ids):
+        """
+        Returns `{post id: pub_date}` of the new posts.
+        """
+        activity = self.zipf_weights(len(user_ids), ACTIVITY_SKEW)
+        start = self.now - timedelta(days=self.days)
+        step = timedelta(days=self.days) / max(count, 1)
+        dates = [start + step * number for number in range(count)]
+
+        def posts():
+            for pub_date in dates:
+                group_id = None
+                if group_ids and self.random.random() < 0.6:
+                    group_id = self.random.choice(group_ids)
+                yield Post(
+                    text=self.text(5, 60),
+                    pub_date=pub_date,
+                    author_id=self.random.choices(
+                        user_ids, cum_weights=activity
+                    )[0],
+                    group_id=group_id,
+                )
+
+        with explicit_dates(Post, "pub_date"):
+            self.insert(Post, posts())
+        self.report(f"posts: {count}")
+        return dict(zip(self.new_pks(Post.objects.all(), count), dates))
+
+    def generate_follows(self, count, user_ids):
+        popularity = self.zipf_weights(len(user_ids), FOLLOWER_SKEW)
+
+        def follows():
+            for _ in range(count):
+                user_id = self.random.choice(user_ids)
+                author_id = self.random.choices(
+                    user_ids, cum_weights=popularity
+                )[0]
+                if user_id != author_id:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        # Repeated pairs are skipped, so there are a bit fewer rows.
+        self.insert(Follow, follows())
+        self.report(f"follows: up to {count}")
+
+    def generate_comments(self, count, user_ids, post_dates):
+        post_ids = list(post_dates)
+        if not post_ids:
+            return
+        popularity = self.zipf_weights(len(post_ids), COMMENT_SKEW)
+
+        def comments():
+            for _ in range(count):
+                post_id = self.random.choices(
+                    post_ids, cum_weights=popularity
+                )[0]
+                delay = timedelta(minutes=self.random.expovariate(1 / 600))
+                yield Comment(
+                    text=self.text(2, 25),
+                    created=min(post_dates[post_id] + delay, self.now),
+                    post_id=post_id,
+                    author_id=self.random.choice(user_ids),
+                )
+
+        with explicit_dates(Comment, "created"):
+            self.insert(Comment, comments())
+        self.report(f"comments: {count}")
@@ -0,0 +1,230 @@
+"""
+Versioned keys for the feed fragment caches.
+
+Every feed fragment key carries the versions of the scopes the feed
+depends on: the whole site, a group, an author or a follower. Writes
+bump the versions of the scopes they touch, so fragments can be kept
+for hours and still never show stale content.
+
+Single posts are cached once for all the feeds showing them, under keys
+made of everything their fragment shows: an edit, a new comment or
+another image gives the post a new key, and no version has to be read.
+"""
+
+import hashlib
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Comment, Follow, Post
+from .timeline import fanout_exempt_authors
+
+VERSION_PREFIX = "feed-version:"
+STATS_PREFIX = "feed-cache-stats:"
+ITEM_PREFIX = "post-item:"
+
+SITE = "site"
+
+FRAGMENT_NAMES = (
+    "index_page",
+    "group_page",
+    "profile_page",
+    "follow_page",
+    "post_item",
+)
+
+_local = threading.local()
+
+
+def group_scope(group_id):
+    return f"group:{group_id}"
+
+
+def author_scope(author_id):
+    return f"author:{author_id}"
+
+
+def follower_scope(user_id):
+    return f"follower:{user_id}"
+
+
+def post_scope(post_id):
+    return f"post:{post_id}"
+
+
+def fragment_cache():
+    return caches[settings.FEED_CACHE_ALIAS]
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def versions(*scopes):
+    """
+    Returns a string combining the current versions of `scopes`,
+    to be used as a part of a fragment cache key.
+    """
+    cache = fragment_cache()
+    keys = [VERSION_PREFIX + scope for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return ".".join(found[key] for key in keys)
+
+
+def item_key(post):
+    """
+    Returns the cache key of the fragment of `post`,
+    which changes with any of the data shown in it.
+    """
+    group = post.group if post.group_id is not None else None
+    shown = (
+        post.text,
+        post.image.name or "",
+        post.comment_count,
+        post.author.username,
+        group.slug if group else "",
+        group.title if group else "",
+    )
+    digest = hashlib.md5(repr(shown).encode()).hexdigest()
+    return f"{ITEM_PREFIX}{post.pk}:{digest}"
+
+
+def bump(*scopes):
+    """
+    Invalidates fragments depending on `scopes` once the current
+    transaction commits. Bumps of one transaction are written together.
+    """
+    pending = getattr(_local, "pending", None)
+    if pending is not None and _flush_scheduled():
+        pending.update(scopes)
+        return
+    _local.pending = set(scopes)
+    transaction.on_commit(_flush)
+
+
+def _flush_scheduled():
+    # A rolled back transaction drops its callbacks,
+    # and the pending scopes have to be started over.
+    return any(func is _flush for _, func in connection.run_on_commit)
+
+
+def _flush():
+    scopes, _local.pending = _local.pending, None
+    commented = {
+        int(scope.split(":", 1)[1])
+        for scope in scopes
+        if scope.startswith("post:")
+    }
+    for post in Post.objects.filter(pk__in=commented).only(
+        "author_id", "group_id"
+    ):
+        scopes.update(_post_scopes(post))
+
+    expanded = set()
+    for scope in scopes:
+        if scope.startswith("followers-of:"):
+            author_id = int(scope.split(":", 1)[1])
+            if author_id in fanout_exempt_authors():
+                # Follow feeds are keyed on the versions
+                # of the followed exempt authors instead.
+                continue
+            followers = Follow.objects.filter(author_id=author_id)
+            expanded.update(
+                follower_scope(user_id)
+                for user_id in followers.values_list("user_id", flat=True)
+            )
+        else:
+            expanded.add(scope)
+    fragment_cache().set_many(
+        {VERSION_PREFIX + scope: _new_version() for scope in expanded},
+        timeout=None,
+    )
+
+
+def _post_scopes(post):
+    scopes = {
+        SITE,
+        post_scope(post.id),
+        author_scope(post.author_id),
+        f"followers-of:{post.author_id}",
+    }
+    loaded_group_id = getattr(post, "_loaded_values", {}).get("group_id")
+    for group_id in (post.group_id, loaded_group_id):
+        if group_id is not None:
+            scopes.add(group_scope(group_id))
+    return scopes
+
+
+def record(fragment_name, hit, count=1):
+    """
+    Counts hits or misses of the fragment cache.
+    """
+    if not count:
+        return
+    cache = fragment_cache()
+    key = f"{STATS_PREFIX}{fragment_name}:{'hits' if hit else 'misses'}"
+    try:
+        cache.incr(key, count)
+    except ValueError:
+        if not cache.add(key, count, timeout=None):
+            cache.incr(key, count)
+
+
+def stats(fragment_names):
+    """
+    Returns `{fragment name: (hits, misses)}`.
+    """
+    keys = [
+        f"{STATS_PREFIX}{name}:{kind}"
+        for name in fragment_names
+        for kind in ("hits", "misses")
+    ]
+    found = fragment_cache().get_many(keys)
+    return {
+        name: (
+            found.get(f"{STATS_PREFIX}{name}:hits", 0),
+            found.get(f"{STATS_PREFIX}{name}:misses", 0),
+        )
+        for name in fragment_names
+    }
+
+
+def reset_stats(fragment_names):
+    fragment_cache().delete_many(
+        [
+            f"{STATS_PREFIX}{name}:{kind}"
+            for name in fragment_names
+            for kind in ("hits", "misses")
+        ]
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_on_post_change(**kwargs):
+    bump(*_post_scopes(kwargs["instance"]))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_on_comment_change(**kwargs):
+    # Comment counters are shown in feeds. The post is looked up
+    # on commit, once for all the comments changed in a transaction.
+    bump(post_scope(kwargs["instance"].post_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_on_follow_change(**kwargs):
+    # The author's pages show their followers counter.
+    follow = kwargs["instance"]
+    bump(follower_scope(follow.user_id), author_scope(follow.author_id))
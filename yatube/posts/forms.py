@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from . import images
 from .models import Post, Comment
 
 
@@ -8,6 +10,19 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ("group", "text", "image")
 
+    def clean_image(self):
+        image = self.cleaned_data.get("image")
+        if isinstance(image, UploadedFile):
+            image = images.ingest(image)
+            self.instance.image_width = image.width
+            self.instance.image_height = image.height
+            self.instance.image_size = image.size
+        elif not image:
+            self.instance.image_width = None
+            self.instance.image_height = None
+            self.instance.image_size = None
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
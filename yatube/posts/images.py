@@ -0,0 +1,79 @@
+"""
+Ingestion of uploaded post images.
+
+Uploads bigger than `FILE_UPLOAD_MAX_MEMORY_SIZE` are streamed to disk
+by Django. The image is then decoded at a reduced scale where the format
+allows it (JPEG draft mode), shrunk to `POST_IMAGE_MAX_DIMENSION`,
+rotated by its EXIF orientation and re-encoded without metadata.
+"""
+
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+EXTENSIONS = {"WEBP": ".webp", "JPEG": ".jpg", "PNG": ".png"}
+
+
+class IngestedImage(ContentFile):
+    """
+    The re-encoded image, ready to be assigned to `Post.image`.
+    """
+
+    def __init__(self, content, name, width, height):
+        super().__init__(content, name=name)
+        self.width = width
+        self.height = height
+
+
+def ingest(upload):
+    """
+    Returns an `IngestedImage` made of the uploaded file.
+    Raises `ValidationError` for files too big to be taken.
+    """
+    if upload.size > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            "Файл больше %s."
+            % filesizeformat(settings.POST_IMAGE_MAX_UPLOAD_SIZE)
+        )
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+        # Only the header has been read so far
+        width, height = image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ValidationError("Изображение слишком большое.")
+        limit = settings.POST_IMAGE_MAX_DIMENSION
+        image.draft("RGB", (limit, limit))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((limit, limit), Image.LANCZOS)
+    except (OSError, Image.DecompressionBombError) as error:
+        raise ValidationError("Не удалось прочитать изображение.") from error
+
+    image_format = settings.POST_IMAGE_FORMAT
+    if image.mode not in ("RGB", "RGBA"):
+        has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    if image_format == "JPEG" and image.mode == "RGBA":
+        image = image.convert("RGB")
+
+    buffer = BytesIO()
+    # EXIF is not passed on, so it is stripped
+    image.save(
+        buffer,
+        image_format,
+        quality=settings.POST_IMAGE_QUALITY,
+        optimize=True,
+        icc_profile=image.info.get("icc_profile"),
+    )
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return IngestedImage(
+        buffer.getvalue(),
+        name=stem + EXTENSIONS[image_format],
+        width=image.width,
+        height=image.height,
+    )
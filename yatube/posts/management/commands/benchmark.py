@@ -0,0 +1,75 @@
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import benchmark
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests every route of posts.urls through the WSGI application "
+        "and reports p50/p95 latency, SQL queries and response size as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="How many measured requests are made per route",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=2,
+            help="How many requests per route are made before measuring",
+        )
+        parser.add_argument(
+            "--anonymous",
+            action="store_true",
+            help="Request the routes without logging in",
+        )
+        parser.add_argument(
+            "--output", help="File to write the report to, stdout if omitted"
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat has to be positive")
+        from yatube.wsgi import application
+
+        try:
+            report = benchmark.run(
+                application,
+                repeat=options["repeat"],
+                warmup=options["warmup"],
+                anonymous=options["anonymous"],
+            )
+        except benchmark.NotEnoughData as error:
+            raise CommandError(error)
+        report["commit"] = current_commit()
+        report["created"] = timezone.now().isoformat()
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options["output"] is None:
+            self.stdout.write(output)
+            return
+        with open(options["output"], "w") as report_file:
+            report_file.write(output + "\n")
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote the report to {options['output']}")
+        )
@@ -0,0 +1,84 @@
+import json
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds a synthetic follow graph in memory, scores its users "
+        "and reports the build time, memory use and throughput as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000_000)
+        parser.add_argument("--edges", type=int, default=10_000_000)
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=10000,
+            help="How many random users are scored, 0 scores all of them",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="How many processes score the users, the estimate "
+            "of a sampled run assumes as many",
+        )
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options["users"] < 2 or options["edges"] < 1:
+            raise CommandError("The graph needs 2 users and 1 follow")
+        top_k = settings.RECOMMENDATIONS_TOP_K
+
+        started = time.monotonic()
+        graph = recommendations.synthetic_graph(
+            options["users"], options["edges"], options["seed"]
+        )
+        build_seconds = time.monotonic() - started
+
+        started = time.monotonic()
+        if options["sample"]:
+            rng = random.Random(options["seed"])
+            scored = min(options["sample"], options["users"])
+            suggestions = 0
+            for user in rng.sample(range(options["users"]), scored):
+                suggestions += len(graph.suggest(user, top_k))
+            # The sample is scored in this process only
+            speedup = options["workers"]
+        else:
+            scored = graph.size
+            suggestions = sum(
+                len(rows)
+                for _, _, rows in recommendations.compute(
+                    graph, workers=options["workers"], top_k=top_k
+                )
+            )
+            speedup = 1
+        score_seconds = time.monotonic() - started
+
+        users_per_second = scored / score_seconds if score_seconds else None
+        report = {
+            "users": options["users"],
+            "edges": graph.edges,
+            "build_s": round(build_seconds, 2),
+            "graph_mib": round(graph.nbytes / 2**20, 1),
+            "scored_users": scored,
+            "workers": options["workers"],
+            "suggestions": suggestions,
+            "score_s": round(score_seconds, 2),
+            "users_per_s": round(users_per_second or 0, 1),
+            # Time to score every user at the measured rate
+            "estimated_full_run_s": (
+                round(options["users"] / users_per_second / speedup, 1)
+                if users_per_second
+                else None
+            ),
+        }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,75 @@
+import time
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from yatube import static
+
+
+class Command(BaseCommand):
+    help = (
+        "Run after collectstatic: checks that templates refer to static "
+        "files through {% static %}, writes precompressed variants "
+        "of the collected files and their manifest"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="How many files are compressed at once, "
+            "the number of CPUs by default",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            static.hashed_names(staticfiles_storage)
+        except static.PipelineError as error:
+            raise CommandError(error)
+
+        problems = [
+            f"{path}:{number}: {line}"
+            for path, number, line in static.literal_references()
+        ] + [
+            f"{path}:{number}: {name} was not collected"
+            for path, number, name in static.unresolved_references(
+                staticfiles_storage
+            )
+        ]
+        for problem in problems:
+            self.stderr.write(problem)
+        if problems:
+            raise CommandError(
+                f"{len(problems)} template lines would miss the "
+                "fingerprinted files, refer to collected files "
+                "with {% static %}"
+            )
+        if "br" not in static.ENCODINGS:
+            self.stderr.write(
+                self.style.WARNING(
+                    "The brotli package is not installed, "
+                    "only gzip variants are written"
+                )
+            )
+
+        started = time.monotonic()
+        manifest = static.build(
+            staticfiles_storage, workers=options["workers"]
+        )
+        files = manifest["files"].values()
+        original = sum(entry["size"] for entry in files)
+        compressed = sum(
+            min(
+                [entry["size"]]
+                + [variant["size"] for variant in entry["encodings"].values()]
+            )
+            for entry in files
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Built {len(manifest['files'])} static files in "
+                f"{time.monotonic() - started:.1f}s, "
+                f"{original // 1024} KiB served as {compressed // 1024} KiB"
+            )
+        )
@@ -0,0 +1,28 @@
+from django.core import checks
+from django.core.management.base import BaseCommand
+
+from yatube.checks import TAG
+
+
+class Command(BaseCommand):
+    help = (
+        "Warns about settings on the hot path of every request "
+        "that are left at their development values"
+    )
+    requires_system_checks = False
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fail-level",
+            default="ERROR",
+            choices=["CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"],
+            help="Message level that makes the command exit with an error",
+        )
+
+    def handle(self, *args, **options):
+        self.check(
+            tags=[TAG],
+            display_num_errors=True,
+            include_deployment_checks=True,
+            fail_level=getattr(checks, options["fail_level"]),
+        )
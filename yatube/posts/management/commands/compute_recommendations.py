@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Computes the suggestions of authors to follow for every user "
+        "from the follow graph"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="How many processes score the users",
+        )
+        parser.add_argument(
+            "--top-k",
+            type=int,
+            default=settings.RECOMMENDATIONS_TOP_K,
+            help="How many suggestions are kept per user",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=recommendations.CHUNK_SIZE,
+            help="How many follows are read per query",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=recommendations.BATCH_SIZE,
+            help="How many user ids are scored and written at once",
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1 or options["top_k"] < 1:
+            raise CommandError("--workers and --top-k have to be positive")
+        started = time.monotonic()
+        graph = recommendations.Graph.from_database(options["chunk_size"])
+        self.stdout.write(
+            f"Loaded {graph.edges} follows into "
+            f"{graph.nbytes / 2**20:.1f} MiB "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+        written = 0
+        for start, end, rows in recommendations.compute(
+            graph,
+            workers=options["workers"],
+            top_k=options["top_k"],
+            batch_size=options["batch_size"],
+        ):
+            written += recommendations.store(start, end, rows)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored {written} suggestions "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = (
+        "Brings the trending scores up to date and drops cooled down "
+        "posts, to be run every few minutes"
+    )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        dropped = trending.decay()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Dropped {dropped} posts from trending "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+        )
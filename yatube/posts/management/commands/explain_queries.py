@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark, query_plans
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests every page and API route, explains the plans of their "
+        "queries on the current database and fails on full table scans "
+        "and temporary B-tree sorts"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--anonymous",
+            action="store_true",
+            help="Request the routes without logging in",
+        )
+        parser.add_argument(
+            "--no-fail",
+            action="store_true",
+            help="Only report the flagged plans, exit successfully",
+        )
+
+    def handle(self, *args, **options):
+        from yatube.wsgi import application
+
+        try:
+            report = query_plans.run(
+                application, anonymous=options["anonymous"]
+            )
+        except (
+            benchmark.NotEnoughData,
+            query_plans.UnsupportedDatabase,
+        ) as error:
+            raise CommandError(error)
+
+        flagged = 0
+        for name, route in report.items():
+            self.stdout.write(
+                f"{name} {route['path']}: {route['status']}, "
+                f"{route['queries']} queries"
+            )
+            for query in route["flagged"]:
+                flagged += 1
+                for step in query["steps"]:
+                    self.stdout.write(self.style.WARNING(f"  {step}"))
+                self.stdout.write(f"    {query['sql']}")
+                self.stdout.write(f"    params: {query['params']}")
+
+        if flagged and not options["no_fail"]:
+            raise CommandError(f"{flagged} queries scan or sort whole tables")
+        self.stdout.write(
+            self.style.SUCCESS(f"Explained {len(report)} routes")
+        )
@@ -0,0 +1,53 @@
+import gzip
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import content
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams groups, posts, comments and follows as JSON lines, "
+        "gzipped when the file name ends with .gz"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "output", nargs="?", default="-", help="File name, - for stdout"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=content.CHUNK_SIZE,
+            help="How many rows are read per query",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        output = options["output"]
+        if output == "-":
+            stream = sys.stdout
+        elif output.endswith(".gz"):
+            stream = gzip.open(output, "wt", encoding="utf-8")
+        else:
+            stream = open(output, "w", encoding="utf-8")
+
+        written = 0
+        try:
+            for line in content.export_lines(options["chunk_size"]):
+                stream.write(line)
+                written += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        elapsed = time.monotonic() - started
+        # The report must not mix with the rows written to stdout
+        self.stderr.write(
+            self.style.SUCCESS(
+                f"Exported {written} rows in {elapsed:.1f}s "
+                f"({written / max(elapsed, 0.001):.0f} rows/s)"
+            )
+        )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed_cache
+
+
+class Command(BaseCommand):
+    help = "Shows hit and miss counts of the feed fragment caches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Start counting over"
+        )
+
+    def handle(self, *args, **options):
+        names = feed_cache.FRAGMENT_NAMES
+        for name, (hits, misses) in feed_cache.stats(names).items():
+            total = hits + misses
+            ratio = hits / total if total else 0
+            self.stdout.write(
+                f"{name}: {hits} hits, {misses} misses, "
+                f"hit ratio {ratio:.1%}"
+            )
+        if options["reset"]:
+            feed_cache.reset_stats(names)
@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+from posts.bulk import refresh_derived_data
+from posts.dataset import PASSWORD, Generator
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with a seeded dataset for load testing, "
+        "e.g. --users 100000 --posts 1000000 --follows 10000000"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=10000)
+        parser.add_argument("--follows", type=int, default=20000)
+        parser.add_argument("--comments", type=int, default=20000)
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="How many days back the posts are spread over",
+        )
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument(
+            "--prefix",
+            default="load",
+            help="Prefix of the generated usernames and group slugs",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="How many rows are inserted per query",
+        )
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f"Users named {prefix}* exist already, "
+                "choose another --prefix"
+            )
+        if options["users"] < 2:
+            raise CommandError("At least two users are needed")
+
+        started = time.monotonic()
+        generator = Generator(
+            seed=options["seed"],
+            prefix=prefix,
+            days=options["days"],
+            batch_size=options["batch_size"],
+            stdout=self.stdout,
+        )
+        generator.generate(
+            users=options["users"],
+            groups=options["groups"],
+            posts=options["posts"],
+            follows=options["follows"],
+            comments=options["comments"],
+        )
+        refresh_derived_data(stdout=self.stdout)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated the dataset in {time.monotonic() - started:.1f}s, "
+                f"every user's password is {PASSWORD!r}"
+            )
+        )
@@ -0,0 +1,61 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def _generate(task):
+    name, geometry = task
+    try:
+        thumbnails.generate(name, geometry)
+    except Exception as error:
+        return f"{name} {geometry}: {error}"
+    return None
+
+
+class Command(BaseCommand):
+    help = "Generates missing thumbnails of existing post images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help="Number of worker processes",
+        )
+        parser.add_argument("--chunk-size", type=int, default=16)
+
+    def handle(self, *args, **options):
+        images = (
+            Post.objects.exclude(image="")
+            .exclude(image__isnull=True)
+            .values_list("image", flat=True)
+            .order_by("pk")
+        )
+        tasks = [
+            (name, geometry)
+            for name in images.iterator()
+            for geometry in thumbnails.GEOMETRIES
+        ]
+        # Forked workers must not share the parent's connections.
+        connections.close_all()
+
+        started = time.monotonic()
+        failed = 0
+        with multiprocessing.Pool(options["processes"]) as pool:
+            for error in pool.imap_unordered(
+                _generate, tasks, chunksize=options["chunk_size"]
+            ):
+                if error:
+                    failed += 1
+                    self.stderr.write(error)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {len(tasks) - failed} thumbnails "
+                f"in {time.monotonic() - started:.1f}s, {failed} failed"
+            )
+        )
@@ -0,0 +1,93 @@
+import gzip
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import content
+from posts.bulk import refresh_derived_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads JSON lines written by export_content with bulk inserts, "
+        "keeping the rows that are already present"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "input", nargs="?", default="-", help="File name, - for stdin"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=content.BATCH_SIZE,
+            help="How many rows are inserted per transaction",
+        )
+        parser.add_argument(
+            "--create-users",
+            action="store_true",
+            help="Create the missing authors with unusable passwords "
+            "instead of skipping their rows",
+        )
+        parser.add_argument(
+            "--skip-signals",
+            action="store_true",
+            help="Do not bring up to date the counters, timelines and "
+            "search index that save signals maintain, e.g. when more "
+            "dumps follow. Run reconcile_comment_counts, "
+            "reconcile_user_counters, reconcile_group_stats, "
+            "rebuild_timelines and rebuild_search_index afterwards",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        source = options["input"]
+        if source == "-":
+            stream = sys.stdin
+        elif source.endswith(".gz"):
+            stream = gzip.open(source, "rt", encoding="utf-8")
+        else:
+            stream = open(source, encoding="utf-8")
+
+        importer = content.Importer(
+            batch_size=options["batch_size"],
+            create_users=options["create_users"],
+        )
+        try:
+            importer.load(stream)
+        except (content.ContentError, ValueError, KeyError) as error:
+            raise CommandError(f"Broken dump: {error!r}")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for label, count in importer.imported.items():
+            line = f"{label}: {count} rows"
+            if importer.updated[label]:
+                line += f", {importer.updated[label]} updated"
+            if importer.present[label]:
+                line += f", {importer.present[label]} already present"
+            if importer.conflicting[label]:
+                line += (
+                    f", {importer.conflicting[label]} refused "
+                    "as their ids belong to other rows"
+                )
+            if importer.skipped[label]:
+                line += (
+                    f", {importer.skipped[label]} skipped "
+                    "for unknown users or posts"
+                )
+            self.stdout.write(line)
+        rows = sum(importer.imported.values())
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"Inserted at {rows / max(elapsed, 0.001):.0f} rows/s"
+        )
+        if not options["skip_signals"]:
+            refresh_derived_data(stdout=self.stdout)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {rows} rows in {time.monotonic() - started:.1f}s"
+            )
+        )
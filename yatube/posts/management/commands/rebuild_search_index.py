@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = "Recreates the full-text search index of posts and comments"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=search.CHUNK_SIZE,
+            help="How many rows are read and indexed per query",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        for model in search.INDEXED_MODELS:
+            indexed = search.rebuild(model, options["chunk_size"])
+            self.stdout.write(f"{model._meta.label}: {indexed} rows")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt the search index "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = "Rebuilds materialized home timelines from follows and posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verbose-authors",
+            action="store_true",
+            help="Report every processed author",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        stdout = self.stdout if options["verbose_authors"] else None
+        written = timeline.rebuild(stdout=stdout)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {written} timeline entries "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = "Fixes drifted follower, following and post counters of users"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=counters.CHUNK_SIZE,
+            help="How many users are checked per query",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        fixed = counters.reconcile_user_counters(options["chunk_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Fixed {fixed} user profiles "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = "Generates queued thumbnails of post images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument("--batch-size", type=int, default=20)
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            done = thumbnails.drain(options["batch_size"])
+            processed += done
+            if done:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Processed {processed} thumbnail jobs")
+        )
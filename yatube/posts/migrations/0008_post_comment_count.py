@@ -0,0 +1,38 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:13
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_comments(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    Comment = apps.get_model("posts", "Comment")
+    Post.objects.update(
+        comment_count=Coalesce(
+            Subquery(
+                Comment.objects.filter(post=OuterRef("pk"))
+                .order_by()
+                .values("post")
+                .annotate(total=Count("id"))
+                .values("total")
+            ),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0007_timelineentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+    ]
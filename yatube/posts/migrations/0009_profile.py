@@ -0,0 +1,77 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:14
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def count(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("id"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def create_profiles(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model("posts", "Post")
+    Follow = apps.get_model("posts", "Follow")
+    Profile = apps.get_model("posts", "Profile")
+    users = User.objects.annotate(
+        followers_count=count(Follow, "author"),
+        following_count=count(Follow, "user"),
+        posts_count=count(Post, "author"),
+    ).values_list("pk", "followers_count", "following_count", "posts_count")
+    Profile.objects.bulk_create(
+        (
+            Profile(
+                user_id=pk,
+                followers_count=followers,
+                following_count=following,
+                posts_count=posts,
+            )
+            for pk, followers, following, posts in users.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0011_update_proxy_permissions"),
+        ("posts", "0008_post_comment_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Profile",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="profile",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "followers_count",
+                    models.PositiveIntegerField(db_index=True, default=0),
+                ),
+                ("following_count", models.PositiveIntegerField(default=0)),
+                ("posts_count", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_profiles, migrations.RunPython.noop),
+    ]
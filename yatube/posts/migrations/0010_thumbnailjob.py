@@ -0,0 +1,42 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0009_profile"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ThumbnailJob",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("geometry", models.CharField(max_length=50)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="thumbnail_jobs",
+                        to="posts.Post",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("post", "geometry")},
+            },
+        ),
+    ]
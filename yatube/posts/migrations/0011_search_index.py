@@ -0,0 +1,35 @@
+from django.db import migrations
+
+INDEXED_TABLES = ("posts_post", "posts_comment")
+
+
+def create_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for table in INDEXED_TABLES:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {table}_fts USING fts5("
+            "text, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {table}_fts (rowid, text) "
+            f"SELECT id, text FROM {table}"
+        )
+
+
+def drop_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for table in INDEXED_TABLES:
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0010_thumbnailjob"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_tables, drop_fts_tables),
+    ]
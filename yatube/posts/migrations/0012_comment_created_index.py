@@ -0,0 +1,20 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0011_search_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["post", "-created", "-id"],
+                name="posts_comment_post_created_idx",
+            ),
+        ),
+    ]
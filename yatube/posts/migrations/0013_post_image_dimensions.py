@@ -0,0 +1,37 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0012_comment_created_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="image_height",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="image_size",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="image size in bytes",
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="image_width",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True
+            ),
+        ),
+    ]
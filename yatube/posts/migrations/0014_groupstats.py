@@ -0,0 +1,76 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:40
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+import django.db.models.deletion
+
+RECENT_CONTRIBUTORS = 5
+RECENT_SCAN = 200
+
+
+def create_group_stats(apps, schema_editor):
+    Group = apps.get_model("posts", "Group")
+    Post = apps.get_model("posts", "Post")
+    GroupStats = apps.get_model("posts", "GroupStats")
+    groups = Group.objects.annotate(
+        posts_count=Count("posts"), last_post_at=Max("posts__pub_date")
+    ).values_list("pk", "posts_count", "last_post_at")
+    stats = []
+    for pk, posts_count, last_post_at in groups.iterator():
+        authors = (
+            Post.objects.filter(group_id=pk)
+            .order_by("-pub_date", "-id")
+            .values_list("author_id", flat=True)[:RECENT_SCAN]
+        )
+        contributors = list(dict.fromkeys(authors))[:RECENT_CONTRIBUTORS]
+        stats.append(
+            GroupStats(
+                group_id=pk,
+                posts_count=posts_count,
+                last_post_at=last_post_at,
+                recent_contributors=",".join(map(str, contributors)),
+            )
+        )
+    GroupStats.objects.bulk_create(stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0013_post_image_dimensions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GroupStats",
+            fields=[
+                (
+                    "group",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="posts.Group",
+                    ),
+                ),
+                ("posts_count", models.PositiveIntegerField(default=0)),
+                (
+                    "last_post_at",
+                    models.DateTimeField(blank=True, null=True),
+                ),
+                (
+                    "recent_contributors",
+                    models.CharField(blank=True, max_length=200),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="groupstats",
+            index=models.Index(
+                fields=["-posts_count", "-group"],
+                name="posts_groupstats_count_idx",
+            ),
+        ),
+        migrations.RunPython(create_group_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0015_suggestion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrendingScore",
+            fields=[
+                (
+                    "post",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="trending",
+                        serialize=False,
+                        to="posts.Post",
+                    ),
+                ),
+                ("score", models.FloatField(db_index=True)),
+                ("updated", models.FloatField()),
+            ],
+        ),
+    ]
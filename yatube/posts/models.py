@@ -31,14 +31,80 @@ class Post(models.Model):
         related_name="posts",
     )
     image = models.ImageField(upload_to="posts/", blank=True, null=True)
+    # Set by `posts.images.ingest` when the image is uploaded.
+    image_width = models.PositiveIntegerField(
+        null=True, blank=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        null=True, blank=True, editable=False
+    )
+    image_size = models.PositiveIntegerField(
+        "image size in bytes", null=True, blank=True, editable=False
+    )
+    # Maintained by `posts.counters`, fixed by `reconcile_comment_counts`.
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Group and profile pages are paged newest first
+            models.Index(
+                fields=["group", "-pub_date", "-id"],
+                name="posts_post_group_pub_idx",
+            ),
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="posts_post_author_pub_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.text
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Values as they were loaded, so signal handlers can tell
+        # what a save has changed without querying the row again.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(
+        self,
+        force_insert=False,
+        force_update=False,
+        using=None,
+        update_fields=None,
+    ):
+        super().save(
+            force_insert=force_insert,
+            force_update=force_update,
+            using=using,
+            update_fields=update_fields,
+        )
+        # Every post_save handler has compared with the old values,
+        # another save of this instance changes what is stored now.
+        loaded = getattr(self, "_loaded_values", {})
+        deferred = self.get_deferred_fields()
+        for field in self._meta.concrete_fields:
+            if field.attname in deferred:
+                continue
+            if update_fields is not None and not {
+                field.name,
+                field.attname,
+            }.intersection(update_fields):
+                continue
+            value = getattr(self, field.attname)
+            if isinstance(field, models.FileField):
+                value = value.name or None
+            loaded[field.attname] = value
+        self._loaded_values = loaded
+
 
 class Comment(models.Model):
     text = models.TextField()
-    created = models.DateTimeField("date created", auto_now_add=True)
+    created = models.DateTimeField(
+        "date created", auto_now_add=True, db_index=True
+    )
     post = models.ForeignKey(
         Post, on_delete=models.CASCADE, related_name="comments"
     )
@@ -46,6 +112,15 @@ class Comment(models.Model):
         User, on_delete=models.CASCADE, related_name="comments"
     )
 
+    class Meta:
+        indexes = [
+            # Comments of a post are paged newest first
+            models.Index(
+                fields=["post", "-created", "-id"],
+                name="posts_comment_post_created_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -60,11 +135,169 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ("user", "author")
+        indexes = [
+            # Followers of an author are read on every fan-out
+            models.Index(
+                fields=["author", "user"], name="posts_follow_author_user_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.user.username
 
 
+class Profile(models.Model):
+    """
+    Per-user counters maintained by `posts.counters`,
+    so profile pages do not count follows and posts on every render.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="profile",
+    )
+    followers_count = models.PositiveIntegerField(default=0, db_index=True)
+    following_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.user.username
+
+
+class GroupStats(models.Model):
+    """
+    Per-group summary maintained by `posts.counters`,
+    so the group directory and group pages do not count posts.
+    """
+
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    last_post_at = models.DateTimeField(null=True, blank=True)
+    # Ids of the latest distinct authors, newest first, comma separated.
+    recent_contributors = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        indexes = [
+            # The directory is paged biggest groups first
+            models.Index(
+                fields=["-posts_count", "-group"],
+                name="posts_groupstats_count_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return str(self.group_id)
+
+    @property
+    def contributor_ids(self):
+        return [int(pk) for pk in self.recent_contributors.split(",") if pk]
+
+
+class Suggestion(models.Model):
+    """
+    An author recommended to a user, computed offline
+    by `posts.recommendations` from the follow graph.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="suggestions"
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+"
+    )
+    score = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ("user", "author")
+        indexes = [
+            models.Index(
+                fields=["user", "-score"], name="posts_suggestion_user_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.author_id}"
+
+
+class TrendingScore(models.Model):
+    """
+    Time-decayed engagement of a recently active post,
+    maintained by `posts.trending`.
+    """
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="trending",
+    )
+    # The score as of `updated`, a Unix timestamp
+    score = models.FloatField(db_index=True)
+    updated = models.FloatField()
+
+    def __str__(self):
+        return str(self.post_id)
+
+
+class TimelineEntry(models.Model):
+    """
+    Materialized home timeline: one row per post
+    delivered to a follower of its author.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="timeline"
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    # Copies of the post fields, so a timeline slice is read
+    # and pruned without joining `Post`.
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+"
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-post"],
+                name="posts_timeline_user_pub_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.post_id}"
+
+
+class ThumbnailJob(models.Model):
+    """
+    A thumbnail of a post image waiting to be generated
+    by the `thumbnail_worker` command.
+    """
+
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="thumbnail_jobs"
+    )
+    geometry = models.CharField(max_length=50)
+    created = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("post", "geometry")
+
+    def __str__(self):
+        return f"{self.post_id} {self.geometry}"
+
+
 @receiver(models.signals.post_delete, sender=Post)
 def auto_delete_image_on_delete(**kwargs):
     """
@@ -84,11 +317,20 @@ def auto_delete_image_on_change(**kwargs):
     with new image.
     """
     instance = kwargs["instance"]
-    try:
-        old_image = Post.objects.get(pk=instance.pk).image
-        new_image = instance.image
-    except Post.DoesNotExist:
+    if kwargs["raw"] or instance._state.adding:
         return
+    loaded = getattr(instance, "_loaded_values", {})
+    if "image" in loaded:
+        old_name = loaded["image"]
+    else:
+        # The image was deferred when the post was loaded
+        old_name = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list("image", flat=True)
+            .first()
+        )
 
-    if old_image and (not old_image == new_image):
-        delete(old_image)
+    new_name = instance.image.name if instance.image else None
+    if old_name and old_name != new_name:
+        field = Post._meta.get_field("image")
+        delete(field.attr_class(instance, field, old_name))
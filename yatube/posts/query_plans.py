@@ -0,0 +1,160 @@
+"""
+Query plan advisor for the routes of `posts.urls` and `posts.api_urls`.
+
+Every route is requested through the WSGI application like in
+`posts.benchmark`, with caches disabled so that each query the views
+can issue does run. The SELECT statements are then explained with
+`EXPLAIN QUERY PLAN` on the database they were sent to, and plans
+reading a whole table or sorting rows in a temporary B-tree are flagged.
+"""
+
+import re
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core import signals
+from django.db import (
+    close_old_connections,
+    connection,
+    connections,
+    transaction,
+)
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from . import api_urls, benchmark
+
+FULL_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(?P<table>\w+)(?P<rest>.*)$")
+TEMP_SORT_RE = re.compile(
+    r"USE TEMP B-TREE FOR (?:ORDER BY|GROUP BY|DISTINCT)"
+)
+
+# Steps accepted as they are: the post form lists every group,
+# and row estimates read the statistics, a row per index.
+ACCEPTED_STEPS = {"SCAN posts_group", "SCAN sqlite_stat1"}
+
+DISABLED_CACHES = {
+    "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+class UnsupportedDatabase(Exception):
+    pass
+
+
+class QueryLog:
+    """
+    Execute wrapper keeping the statements sent to a connection.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many:
+            self.queries.append((context["connection"].alias, sql, params))
+        return execute(sql, params, many, context)
+
+
+def problems(plan, tables):
+    """
+    Returns the steps of `plan` that read every row of one of `tables`
+    or sort rows in a temporary B-tree.
+    """
+    found = []
+    for detail in plan:
+        if detail in ACCEPTED_STEPS:
+            continue
+        scan = FULL_SCAN_RE.match(detail)
+        if scan is not None:
+            # Virtual tables, like the full-text index, do their own lookups
+            rest = scan.group("rest")
+            if (
+                scan.group("table") in tables
+                and "USING" not in rest
+                and "VIRTUAL TABLE" not in rest
+            ):
+                found.append(detail)
+        elif TEMP_SORT_RE.search(detail):
+            found.append(detail)
+    return found
+
+
+def explain(alias, sql, params):
+    with connections[alias].cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def _is_read(sql):
+    return sql.lstrip().upper().startswith(("SELECT", "WITH"))
+
+
+def routes(kwargs):
+    """
+    Returns `(name, path)` of every page and API route.
+    """
+    result = benchmark.routes(kwargs)
+    for pattern in api_urls.urlpatterns:
+        name = f"{api_urls.app_name}:{pattern.name}"
+        path = reverse(
+            name,
+            kwargs={key: kwargs[key] for key in pattern.pattern.converters},
+        )
+        result.append((name, path))
+    return result
+
+
+def run(application, anonymous=False):
+    """
+    Requests every route once and returns, for each of them,
+    its path, status, number of queries and flagged statements.
+    """
+    if connection.vendor != "sqlite":
+        raise UnsupportedDatabase(
+            "Query plans can only be explained on SQLite"
+        )
+    caches = {alias: DISABLED_CACHES for alias in settings.CACHES}
+    signals.request_started.disconnect(close_old_connections)
+    signals.request_finished.disconnect(close_old_connections)
+    try:
+        with override_settings(CACHES=caches), transaction.atomic():
+            kwargs = benchmark.sample_kwargs()
+            cookie = ""
+            if not anonymous:
+                viewer = benchmark.sample_viewer(kwargs["username"])
+                cookie = benchmark.session_cookie(viewer)
+            report = {}
+            for name, path in routes(kwargs):
+                report[name] = _explain_route(application, path, cookie)
+            transaction.set_rollback(True)
+    finally:
+        signals.request_started.connect(close_old_connections)
+        signals.request_finished.connect(close_old_connections)
+    return report
+
+
+def _explain_route(application, path, cookie):
+    log = QueryLog()
+    # Reads of replica routed views go to other connections
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(log))
+        status, _, _ = benchmark.call(application, path, cookie)
+
+    flagged = []
+    tables = {}
+    for alias, sql, params in log.queries:
+        if not _is_read(sql):
+            continue
+        if alias not in tables:
+            tables[alias] = set(connections[alias].introspection.table_names())
+        steps = problems(explain(alias, sql, params), tables[alias])
+        if steps:
+            flagged.append({"sql": sql, "params": params, "steps": steps})
+    return {
+        "path": path,
+        "status": status,
+        "queries": len(log.queries),
+        "flagged": flagged,
+    }
@@ -0,0 +1,251 @@
+"""
+"Who to follow" suggestions computed offline from the follow graph.
+
+`Follow` rows are read in primary key chunks into two integer arrays,
+then turned into compressed adjacency lists (CSR): `offsets[user]` and
+`offsets[user + 1]` delimit the slice of `neighbours` holding the users
+they follow, or their followers. A user is scored against the authors
+
+- followed by the authors they follow (friends of friends),
+- followed by the users who follow the same authors (co-follows),
+
+and their `top_k` best unfollowed authors are stored as `Suggestion`
+rows. Users are scored in ranges of ids, possibly in several processes
+which inherit the graph when forked.
+"""
+
+import itertools
+import multiprocessing
+from array import array
+from collections import Counter
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import feed_cache
+from .dataset import FOLLOWER_SKEW, Generator
+from .models import Follow, Profile, Suggestion
+
+CHUNK_SIZE = 100000
+BATCH_SIZE = 5000
+FRIEND_OF_FRIEND_WEIGHT = 2
+CO_FOLLOW_WEIGHT = 1
+# Neighbour lists longer than this are truncated to their first entries,
+# the oldest follows, so that following a hub with a million followers
+# costs as much as any other follow.
+MAX_FANOUT = 50
+
+
+def _csr(keys, values, size):
+    """
+    Groups `values` by `keys` with a counting sort.
+    """
+    counts = array("q", bytes(8 * (size + 1)))
+    for key in keys:
+        counts[key + 1] += 1
+    offsets = array("q", itertools.accumulate(counts))
+    neighbours = array("i", bytes(4 * len(values)))
+    positions = array("q", offsets)
+    for key, value in zip(keys, values):
+        neighbours[positions[key]] = value
+        positions[key] += 1
+    return offsets, neighbours
+
+
+class Graph:
+    """
+    The follow graph as adjacency arrays indexed by user id.
+    """
+
+    def __init__(self, users, authors, eligible=None):
+        self.size = max(max(users, default=0), max(authors, default=0)) + 1
+        self.edges = len(users)
+        self.following = _csr(users, authors, self.size)
+        self.followers = _csr(authors, users, self.size)
+        # Flags of the users worth suggesting, everyone if None
+        self.eligible = eligible
+
+    @classmethod
+    def from_database(cls, chunk_size=CHUNK_SIZE):
+        users, authors = array("i"), array("i")
+        last_pk = 0
+        while True:
+            chunk = list(
+                Follow.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", "user_id", "author_id")[:chunk_size]
+            )
+            if not chunk:
+                break
+            for _, user_id, author_id in chunk:
+                users.append(user_id)
+                authors.append(author_id)
+            last_pk = chunk[-1][0]
+        graph = cls(users, authors)
+        eligible = bytearray(graph.size)
+        for user_id in Profile.objects.filter(
+            posts_count__gt=0, user_id__lt=graph.size
+        ).values_list("user_id", flat=True):
+            eligible[user_id] = 1
+        graph.eligible = eligible
+        return graph
+
+    @property
+    def nbytes(self):
+        arrays = (*self.following, *self.followers)
+        return sum(a.itemsize * len(a) for a in arrays)
+
+    @staticmethod
+    def _neighbours(adjacency, user, limit=None):
+        offsets, neighbours = adjacency
+        start, end = offsets[user], offsets[user + 1]
+        if limit is not None:
+            end = min(end, start + limit)
+        return neighbours[start:end]
+
+    def suggest(self, user, top_k):
+        """
+        Returns up to `top_k` `(author, score)` pairs for `user`,
+        best first.
+        """
+        followed = self._neighbours(self.following, user)
+        if not followed:
+            return []
+        # Counter.update counts an array in C, weights are repetitions.
+        scores = Counter()
+        co_followers = Counter()
+        for author in followed[:MAX_FANOUT]:
+            friends = self._neighbours(self.following, author, MAX_FANOUT)
+            for _ in range(FRIEND_OF_FRIEND_WEIGHT):
+                scores.update(friends)
+            co_followers.update(
+                self._neighbours(self.followers, author, MAX_FANOUT)
+            )
+        del co_followers[user]
+        # The users sharing most follows vote for the authors they follow
+        for co_follower, _ in co_followers.most_common(MAX_FANOUT):
+            follows = self._neighbours(self.following, co_follower, MAX_FANOUT)
+            for _ in range(CO_FOLLOW_WEIGHT):
+                scores.update(follows)
+
+        for author in followed:
+            del scores[author]
+        del scores[user]
+        eligible = self.eligible
+        suggestions = []
+        for author, score in sorted(
+            scores.items(), key=itemgetter(1), reverse=True
+        ):
+            if eligible is None or eligible[author]:
+                suggestions.append((author, score))
+                if len(suggestions) == top_k:
+                    break
+        return suggestions
+
+    def suggest_range(self, start, end, top_k):
+        """
+        Returns `(user, author, score)` rows for users of ids
+        in `[start, end)`.
+        """
+        rows = []
+        for user in range(start, min(end, self.size)):
+            for author, score in self.suggest(user, top_k):
+                rows.append((user, author, score))
+        return rows
+
+
+def synthetic_graph(users, edges, seed=1):
+    """
+    Returns a graph of `edges` random follows between `users` users,
+    the followed authors being picked along a Zipf law.
+    """
+    generator = Generator(seed)
+    population = range(users)
+    weights = generator.zipf_weights(users, FOLLOWER_SKEW)
+    followers, authors = array("i"), array("i")
+    for start in range(0, edges, CHUNK_SIZE):
+        size = min(CHUNK_SIZE, edges - start)
+        followers.extend(generator.random.choices(population, k=size))
+        authors.extend(
+            generator.random.choices(population, cum_weights=weights, k=size)
+        )
+    return Graph(followers, authors)
+
+
+# Set before the worker processes are forked, so they share it
+_graph = None
+
+
+def _suggest_range(task):
+    start, end, top_k = task
+    return start, end, _graph.suggest_range(start, end, top_k)
+
+
+def compute(graph, workers=1, top_k=None, batch_size=BATCH_SIZE):
+    """
+    Yields `(start, end, rows)` for consecutive ranges of user ids,
+    scored by `workers` processes.
+    """
+    global _graph
+    top_k = top_k or settings.RECOMMENDATIONS_TOP_K
+    tasks = [
+        (start, start + batch_size, top_k)
+        for start in range(0, graph.size, batch_size)
+    ]
+    if workers <= 1:
+        for task in tasks:
+            yield task[0], task[1], graph.suggest_range(*task)
+        return
+    _graph = graph
+    # Forked children must not share the parent's database connections
+    connections.close_all()
+    context = multiprocessing.get_context("fork")
+    try:
+        with context.Pool(workers) as pool:
+            yield from pool.imap(_suggest_range, tasks)
+    finally:
+        _graph = None
+
+
+def store(start, end, rows):
+    """
+    Replaces the suggestions of users of ids in `[start, end)`.
+    Returns the number of written rows.
+    """
+    with transaction.atomic():
+        in_range = Suggestion.objects.filter(
+            user_id__gte=start, user_id__lt=end
+        )
+        changed = set(in_range.values_list("user_id", flat=True).distinct())
+        in_range.delete()
+        Suggestion.objects.bulk_create(
+            Suggestion(user_id=user, author_id=author, score=score)
+            for user, author, score in rows
+        )
+        changed.update(user for user, _, _ in rows)
+        if changed:
+            # Profile and follow pages show the suggestions
+            feed_cache.bump(*map(feed_cache.follower_scope, changed))
+    return len(rows)
+
+
+def suggestions_for(user, limit=None):
+    return list(
+        Suggestion.objects.filter(user=user)
+        .select_related("author")
+        .order_by("-score", "author_id")[
+            : limit or settings.RECOMMENDATIONS_SHOWN
+        ]
+    )
+
+
+@receiver(post_save, sender=Follow)
+def drop_followed_suggestion(**kwargs):
+    if kwargs["created"] and not kwargs["raw"]:
+        follow = kwargs["instance"]
+        Suggestion.objects.filter(
+            user_id=follow.user_id, author_id=follow.author_id
+        ).delete()
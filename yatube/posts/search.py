@@ -0,0 +1,261 @@
+"""
+Full-text search over posts and comments.
+
+The index is kept by a pluggable backend selected with `SEARCH_BACKEND`
+and updated incrementally by `Post` and `Comment` signals.
+`rebuild_search_index` recreates it from the tables.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection, connections, router, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+from .models import Comment, Post
+
+INDEXED_MODELS = (Post, Comment)
+
+WORD_RE = re.compile(r"\w+")
+
+CHUNK_SIZE = 5000
+
+
+class SearchBackend:
+    """
+    Interface of a search index over the `text` field of a model.
+    """
+
+    def index(self, model, rows):
+        """
+        Adds or replaces `(pk, text)` rows of `model`.
+        """
+        raise NotImplementedError
+
+    def remove(self, model, pks):
+        raise NotImplementedError
+
+    def clear(self, model):
+        raise NotImplementedError
+
+    def search(self, model, query, limit, offset=0):
+        """
+        Returns primary keys of `model` rows matching `query`,
+        the best matches first.
+        """
+        raise NotImplementedError
+
+    def rebuild(self, model, chunk_size):
+        """
+        Recreates the index of `model`, committing every chunk of rows
+        so writes are not blocked for the whole rebuild.
+        Returns the number of indexed rows.
+        """
+        with transaction.atomic():
+            self.clear(model)
+        indexed = 0
+        last_pk = 0
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    model.objects.filter(pk__gt=last_pk)
+                    .order_by("pk")
+                    .values_list("pk", "text")[:chunk_size]
+                )
+                if not rows:
+                    return indexed
+                self.index(model, rows)
+            indexed += len(rows)
+            last_pk = rows[-1][0]
+
+
+class DatabaseBackend(SearchBackend):
+    """
+    Scans the table with `LIKE`. Needs no index, so it works on
+    any database, but is only fit for small tables.
+    """
+
+    def index(self, model, rows):
+        pass
+
+    def remove(self, model, pks):
+        pass
+
+    def clear(self, model):
+        pass
+
+    def search(self, model, query, limit, offset=0):
+        queryset = model.objects.all()
+        for word in WORD_RE.findall(query):
+            queryset = queryset.filter(text__icontains=word)
+        return list(
+            queryset.order_by("-pk").values_list("pk", flat=True)[
+                offset : offset + limit
+            ]
+        )
+
+
+class SqliteFTSBackend(SearchBackend):
+    """
+    Keeps an FTS5 table per model, with the row primary key as rowid.
+    Results are ranked by BM25.
+
+    A rebuild fills a shadow table in chunks, each in its own
+    transaction, and swaps it in at the end. Meanwhile searches read
+    the old index, and triggers copy the writes to the shadow table.
+    """
+
+    TOKENIZE = "unicode61 remove_diacritics 2"
+
+    def table(self, model):
+        return f"{model._meta.db_table}_fts"
+
+    def index(self, model, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        table = self.table(model)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {table} WHERE rowid = %s",
+                [(pk,) for pk, _ in rows],
+            )
+            cursor.executemany(
+                f"INSERT INTO {table} (rowid, text) VALUES (%s, %s)", rows
+            )
+
+    def remove(self, model, pks):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {self.table(model)} WHERE rowid = %s",
+                [(pk,) for pk in pks],
+            )
+
+    def clear(self, model):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table(model)}")
+
+    def search(self, model, query, limit, offset=0):
+        match = self.match_expression(query)
+        if not match:
+            return []
+        table = self.table(model)
+        with connections[router.db_for_read(model)].cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {table} WHERE {table} MATCH %s "
+                "ORDER BY rank LIMIT %s OFFSET %s",
+                [match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def rebuild(self, model, chunk_size):
+        table = self.table(model)
+        shadow = f"{table}_rebuild"
+        source = model._meta.db_table
+        pk = model._meta.pk.column
+        text = model._meta.get_field("text").column
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Left over by an interrupted rebuild
+            self._drop_shadow(cursor, shadow)
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {shadow} USING fts5("
+                f"text, tokenize = '{self.TOKENIZE}')"
+            )
+            for event in ("INSERT", f"UPDATE OF {text}"):
+                name = event.split()[0].lower()
+                cursor.execute(
+                    f"CREATE TRIGGER {shadow}_{name} AFTER {event} "
+                    f"ON {source} BEGIN "
+                    f"INSERT OR REPLACE INTO {shadow} (rowid, text) "
+                    f"VALUES (new.{pk}, new.{text}); END"
+                )
+            cursor.execute(
+                f"CREATE TRIGGER {shadow}_delete AFTER DELETE ON {source} "
+                f"BEGIN DELETE FROM {shadow} WHERE rowid = old.{pk}; END"
+            )
+
+        indexed = 0
+        last_pk = 0
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT max({pk}), count(*) FROM (SELECT {pk} "
+                    f"FROM {source} WHERE {pk} > %s ORDER BY {pk} LIMIT %s)",
+                    [last_pk, chunk_size],
+                )
+                chunk_end, copied = cursor.fetchone()
+                if not copied:
+                    break
+                cursor.execute(
+                    f"INSERT OR REPLACE INTO {shadow} (rowid, text) "
+                    f"SELECT {pk}, {text} FROM {source} "
+                    f"WHERE {pk} > %s AND {pk} <= %s",
+                    [last_pk, chunk_end],
+                )
+            indexed += copied
+            last_pk = chunk_end
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for name in ("insert", "update", "delete"):
+                cursor.execute(f"DROP TRIGGER {shadow}_{name}")
+            cursor.execute(f"DROP TABLE {table}")
+            cursor.execute(f"ALTER TABLE {shadow} RENAME TO {table}")
+        return indexed
+
+    @staticmethod
+    def _drop_shadow(cursor, shadow):
+        for name in ("insert", "update", "delete"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {shadow}_{name}")
+        cursor.execute(f"DROP TABLE IF EXISTS {shadow}")
+
+    @staticmethod
+    def match_expression(query):
+        """
+        Turns user input into an FTS5 query matching all of its words,
+        the last one as a prefix. Quoting keeps FTS5 operators inert.
+        """
+        words = WORD_RE.findall(query)
+        if not words:
+            return ""
+        terms = ['"%s"' % word for word in words]
+        terms[-1] += "*"
+        return " ".join(terms)
+
+
+backend = SimpleLazyObject(lambda: import_string(settings.SEARCH_BACKEND)())
+
+
+def find(queryset, query, limit, offset=0):
+    """
+    Returns rows of `queryset` matching `query`, the best matches first.
+    """
+    pks = backend.search(queryset.model, query, limit, offset)
+    found = queryset.in_bulk(pks)
+    return [found[pk] for pk in pks if pk in found]
+
+
+def rebuild(model, chunk_size=CHUNK_SIZE):
+    """
+    Recreates the index of `model` from its table.
+    Returns the number of indexed rows.
+    """
+    return backend.rebuild(model, chunk_size)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def index_on_save(**kwargs):
+    instance = kwargs["instance"]
+    loaded_text = getattr(instance, "_loaded_values", {}).get("text")
+    if kwargs["created"] or instance.text != loaded_text:
+        backend.index(type(instance), [(instance.pk, instance.text)])
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def remove_on_delete(**kwargs):
+    instance = kwargs["instance"]
+    backend.remove(type(instance), [instance.pk])
@@ -0,0 +1,54 @@
+from django import template
+from django.conf import settings
+from django.core.cache.utils import make_template_fragment_key
+
+from posts import feed_cache
+from yatube.routers import replica_used
+
+register = template.Library()
+
+
+class FeedCacheNode(template.Node):
+    def __init__(self, nodelist, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        vary_on = [variable.resolve(context) for variable in self.vary_on]
+        key = make_template_fragment_key(self.fragment_name, vary_on)
+        cache = feed_cache.fragment_cache()
+        value = cache.get(key)
+        feed_cache.record(self.fragment_name, hit=value is not None)
+        if value is None:
+            value = self.nodelist.render(context)
+            timeout = settings.FEED_CACHE_TIMEOUT
+            if replica_used():
+                # A lagging replica could have missed the write
+                # that made the current versions.
+                timeout = settings.FEED_CACHE_REPLICA_TIMEOUT
+            cache.set(key, value, timeout)
+        return value
+
+
+@register.tag
+def feedcache(parser, token):
+    """
+    Caches a feed fragment for `FEED_CACHE_TIMEOUT` seconds
+    and counts hits and misses:
+
+    {% feedcache "index_page" cache_version page.cursor %}...{% endfeedcache %}
+
+    The key has to include versions from `posts.feed_cache.versions`,
+    they are what makes the fragment fresh after a write.
+    """
+    nodelist = parser.parse(("endfeedcache",))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires at least 1 argument."
+        )
+    fragment_name = bits[1].strip("\"'")
+    vary_on = [parser.compile_filter(bit) for bit in bits[2:]]
+    return FeedCacheNode(nodelist, fragment_name, vary_on)
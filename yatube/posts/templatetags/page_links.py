@@ -0,0 +1,38 @@
+from django import template
+from django.conf import settings
+
+register = template.Library()
+
+
+@register.inclusion_tag("paginator.html")
+def page_links(page):
+    """
+    Renders numbered links to the pages around `page` of
+    a `WindowedPaginator`:
+
+    {% page_links page %}
+
+    The window is computed once per page, however many times it is shown.
+    """
+    window = getattr(page, "_window", None)
+    if window is None:
+        window = page.paginator.window(page, settings.PAGINATOR_WINDOW)
+        page._window = window
+    links = [
+        None if link is None else {"number": link[0], "cursor": link[1]}
+        for link in window
+    ]
+    numbered = [link for link in links if link is not None]
+    position = next(
+        index
+        for index, link in enumerate(numbered)
+        if link["cursor"] == page.cursor
+    )
+    return {
+        "links": links,
+        "current": numbered[position]["number"],
+        "previous": numbered[position - 1] if position > 0 else None,
+        "next": (
+            numbered[position + 1] if position + 1 < len(numbered) else None
+        ),
+    }
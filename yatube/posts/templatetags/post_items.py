@@ -0,0 +1,70 @@
+from django import template
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from posts import feed_cache, thumbnails
+
+register = template.Library()
+
+THUMBNAIL_GEOMETRY = "960x339"
+# Stands in the cached fragments for the edit link of the viewer's posts.
+EDIT_LINK = mark_safe("<!-- edit link -->")
+
+
+def _render(context, template_name, **values):
+    item_template = context.template.engine.get_template(template_name)
+    return item_template.render(context.new(values))
+
+
+@register.simple_tag(takes_context=True)
+def post_items(context, posts):
+    """
+    Renders `post_item.html` for each of `posts`, reading the cached
+    fragments with a single `get_many`:
+
+    {% post_items page %}
+
+    Only the edit link of the viewer's own posts is rendered every time.
+    """
+    posts = list(posts)
+    keys = [feed_cache.item_key(post) for post in posts]
+    cache = feed_cache.fragment_cache()
+    found = cache.get_many(keys)
+    missing = {}
+    user = context.get("user")
+    items = []
+    for post, key in zip(posts, keys):
+        item = found.get(key)
+        if item is None:
+            thumbnail = thumbnails.existing_thumbnail(
+                post.image, THUMBNAIL_GEOMETRY
+            )
+            item = _render(
+                context,
+                "post_item.html",
+                post=post,
+                thumbnail=thumbnail,
+                edit_link=EDIT_LINK,
+            )
+            # Until its thumbnail is ready, the post shows the original
+            if not post.image or thumbnail is not None:
+                missing[key] = item
+        edit_link = ""
+        if user is not None and user.pk == post.author_id:
+            edit_link = _render(context, "post_edit_link.html", post=post)
+        items.append(item.replace(EDIT_LINK, edit_link))
+    if missing:
+        cache.set_many(missing, settings.FEED_CACHE_TIMEOUT)
+    feed_cache.record("post_item", hit=True, count=len(found))
+    feed_cache.record("post_item", hit=False, count=len(posts) - len(found))
+    return mark_safe("".join(items))
+
+
+@register.simple_tag(takes_context=True)
+def post_item(context, post):
+    """
+    Renders a single post like `post_items`:
+
+    {% post_item post %}
+    """
+    return post_items(context, [post])
@@ -1,8 +1,43 @@
+import json
+import os
+import shutil
+import tempfile
+from array import array
+from io import BytesIO, StringIO
+
 from django.conf import settings
-from django.test import TestCase, Client, override_settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    Client,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
 from django.contrib.auth import get_user_model
-from .models import Post, Group
+from PIL import Image
+from .models import (
+    Post,
+    Group,
+    Comment,
+    Follow,
+    GroupStats,
+    Profile,
+    Suggestion,
+    ThumbnailJob,
+    TimelineEntry,
+    TrendingScore,
+)
+from .content import Importer, export_lines
+from .pagination import CursorPaginator, WindowedPaginator
+from .recommendations import Graph, compute
+from .thumbnails import drain
+from .timeline import TimelinePaginator
+from . import query_plans, search, trending
 
 
 User = get_user_model()
@@ -288,6 +323,76 @@ class TestImageUpload(TestCase):
                 msg_prefix=f"Image doesn't appear in <{url}> page",
             )
 
+    def test_thumbnail_queue(self):
+        post_edit_url = reverse(
+            "post_edit",
+            kwargs={"username": self.user.username, "post_id": self.post.id},
+        )
+        with open("test_data/test_img.jpg", "rb") as test_img:
+            self.client.post(
+                post_edit_url, {"text": "new text", "image": test_img}
+            )
+        self.assertTrue(
+            ThumbnailJob.objects.filter(post=self.post).exists(),
+            "Uploaded image should be queued for thumbnails",
+        )
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, Post.objects.get().image.url)
+
+        call_command("thumbnail_worker", "--once", stdout=StringIO())
+        self.assertFalse(ThumbnailJob.objects.exists())
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "/media/cache/")
+
+    def upload(self, image_file, name="photo.jpg"):
+        post_edit_url = reverse(
+            "post_edit",
+            kwargs={"username": self.user.username, "post_id": self.post.id},
+        )
+        image_file.seek(0)
+        image_file.name = name
+        return self.client.post(
+            post_edit_url, {"text": "new text", "image": image_file}
+        )
+
+    def test_image_ingestion(self):
+        photo = BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotated 90 degrees
+        Image.new("RGB", (4000, 3000), "red").save(photo, "JPEG", exif=exif)
+        with self.settings(POST_IMAGE_MAX_DIMENSION=1000):
+            self.upload(photo)
+
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertTrue(post.image.name.endswith(".webp"))
+        self.assertEqual((post.image_width, post.image_height), (750, 1000))
+        self.assertEqual(post.image_size, post.image.size)
+        with Image.open(post.image) as stored:
+            self.assertEqual(stored.size, (750, 1000))
+            self.assertFalse(stored.getexif())
+
+        with self.settings(POST_IMAGE_MAX_UPLOAD_SIZE=100):
+            response = self.upload(photo, name="another.jpg")
+        self.assertTrue(response.context["form"].errors["image"])
+        self.assertEqual(Post.objects.get(pk=self.post.pk).image, post.image)
+
+    def test_replaced_image_is_deleted(self):
+        with open("test_data/test_img.jpg", "rb") as test_img:
+            photo = BytesIO(test_img.read())
+        self.upload(photo)
+        old_path = Post.objects.get(pk=self.post.pk).image.path
+        with CaptureQueriesContext(connection) as queries:
+            self.upload(photo, name="replacement.jpg")
+        self.assertFalse(os.path.exists(old_path))
+        self.assertEqual(
+            [
+                query["sql"]
+                for query in queries
+                if query["sql"].startswith('SELECT "posts_post"."image"')
+            ],
+            [],
+        )
+
     def test_non_image_upload(self):
         post_edit_url = reverse(
             "post_edit",
@@ -310,8 +415,23 @@ class TestImageUpload(TestCase):
             post.delete()
 
 
-class TestCachedPages(TestCase):
+class TestCachedPages(TransactionTestCase):
     def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        file_cache = self.settings(
+            CACHES={
+                "default": {
+                    "BACKEND": (
+                        "django.core.cache.backends.filebased.FileBasedCache"
+                    ),
+                    "LOCATION": cache_dir,
+                }
+            }
+        )
+        file_cache.enable()
+        self.addCleanup(file_cache.disable)
+
         self.user = User.objects.create_user(
             username="test_username",
             email="test_mail@yandex.ru",
@@ -331,6 +451,26 @@ class TestCachedPages(TestCase):
         self.client = Client()
         self.client.force_login(self.user)
 
+    def test_thumbnail_replaces_cached_original(self):
+        post_edit_url = reverse(
+            "post_edit",
+            kwargs={"username": self.user.username, "post_id": self.post.id},
+        )
+        with open("test_data/test_img.jpg", "rb") as test_img:
+            self.client.post(
+                post_edit_url, {"text": "new text", "image": test_img}
+            )
+        self.addCleanup(lambda: Post.objects.get(pk=self.post.pk).delete())
+        response = self.client.get(reverse("index"))
+        self.assertNotContains(response, "/media/cache/")
+        etag = response["ETag"]
+
+        drain()
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "/media/cache/")
+        response = self.client.get(reverse("index"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
     def test_cached_page(self):
         index_url = reverse("index")
         post_edit_url = reverse(
@@ -344,11 +484,1072 @@ class TestCachedPages(TestCase):
             msg_prefix="Initial post doesn't appear in <index> page",
         )
 
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(index_url)
+        self.assertFalse(
+            any('FROM "posts_post"' in query["sql"] for query in queries),
+            "Cached <index> page shouldn't query posts",
+        )
+
         text = "This post was edited using a form"
         self.client.post(post_edit_url, {"text": text})
         response = self.client.get(index_url)
-        self.assertNotContains(
+        self.assertContains(
             response,
             text,
-            msg_prefix="Cached <index> page shoudn't render new post instantly",
+            msg_prefix=(
+                "Edited post should appear in cached <index> page instantly"
+            ),
+        )
+
+    def test_cache_stats(self):
+        call_command("feed_cache_stats", "--reset", stdout=StringIO())
+        self.client.get(reverse("index"))
+        self.client.get(reverse("index"))
+        out = StringIO()
+        call_command("feed_cache_stats", stdout=out)
+        self.assertIn("index_page: 1 hits, 1 misses", out.getvalue())
+
+    def test_post_item_shared_by_feeds(self):
+        call_command("feed_cache_stats", "--reset", stdout=StringIO())
+        post_kwargs = {"username": self.user.username, "post_id": self.post.id}
+        post_edit_url = reverse("post_edit", kwargs=post_kwargs)
+        group_url = reverse("group_page", kwargs={"slug": self.group.slug})
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, post_edit_url)
+
+        reader = User.objects.create_user(username="reader", password="pass")
+        reader_client = Client()
+        reader_client.force_login(reader)
+        response = reader_client.get(group_url)
+        self.assertContains(response, self.post.text)
+        self.assertNotContains(
+            response,
+            post_edit_url,
+            msg_prefix=(
+                "Edit link of a cached post is shown to its author only"
+            ),
+        )
+        out = StringIO()
+        call_command("feed_cache_stats", stdout=out)
+        self.assertIn("post_item: 1 hits, 1 misses", out.getvalue())
+
+        reader_client.post(
+            reverse("add_comment", kwargs=post_kwargs), {"text": "A comment"}
+        )
+        response = reader_client.get(group_url)
+        self.assertContains(
+            response,
+            "1 комментарий",
+            msg_prefix="A new comment should change the cached post",
+        )
+
+
+@override_settings(CACHES=settings.TEST_CACHES)
+class TestCursorPagination(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="test_username",
+            email="test_mail@yandex.ru",
+            password="test_password",
+        )
+        Post.objects.bulk_create(
+            Post(text=f"Post number {number}", author=self.user)
+            for number in range(25)
+        )
+        self.client = Client()
+
+    def test_walk_through_pages(self):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+
+        first = paginator.get_page()
+        self.assertEqual(len(first), 10)
+        self.assertFalse(first.has_previous())
+
+        second = paginator.get_page(first.next_cursor)
+        third = paginator.get_page(second.next_cursor)
+        self.assertEqual(len(third), 5)
+        self.assertFalse(third.has_next())
+
+        seen = [post.id for page in (first, second, third) for post in page]
+        self.assertEqual(
+            seen,
+            list(
+                Post.objects.order_by("-pub_date", "-id").values_list(
+                    "id", flat=True
+                )
+            ),
+            "Cursor pages should cover every post exactly once",
+        )
+
+        back = paginator.get_page(third.previous_cursor)
+        self.assertEqual([post.id for post in back], [p.id for p in second])
+
+    def test_numbered_window(self):
+        paginator = WindowedPaginator(Post.objects.all(), 2, count=25)
+        ordered = list(
+            Post.objects.order_by("-pub_date", "-id").values_list(
+                "id", flat=True
+            )
+        )
+
+        def ids(cursor):
+            return [post.id for post in paginator.get_page(cursor)]
+
+        first = paginator.get_page()
+        window = paginator.window(first, 1)
+        self.assertEqual(
+            [link and link[0] for link in window], [1, 2, None, 13]
+        )
+        self.assertEqual(ids(window[-1][1]), ordered[-2:])
+
+        cursor = window[1][1]
+        for number in range(2, 6):
+            window = paginator.window(paginator.get_page(cursor), 1)
+            numbers = [link and link[0] for link in window]
+            self.assertIn(number, numbers)
+            self.assertEqual(
+                ids(cursor), ordered[(number - 1) * 2 : number * 2]
+            )
+            cursor = window[numbers.index(number + 1)][1]
+        self.assertEqual(numbers, [1, None, 4, 5, 6, None, 13])
+
+        # Going back leads to the same pages
+        back = window[numbers.index(4)][1]
+        self.assertEqual(ids(back), ordered[6:8])
+
+    def test_broken_cursor_gives_first_page(self):
+        response = self.client.get(reverse("index"), {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context["page"].has_previous())
+
+    def test_no_count_query(self):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        cursor = paginator.get_page().next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("index"), {"cursor": cursor})
+        for query in queries:
+            self.assertFalse(
+                query["sql"].startswith(
+                    'SELECT COUNT(*) AS "__count" FROM "posts_post"'
+                ),
+                "Feeds should not count posts",
+            )
+
+
+@override_settings(CACHES=settings.TEST_CACHES)
+class TestTimeline(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(
+            username="reader", email="reader@yandex.ru", password="password"
+        )
+        self.author = User.objects.create_user(
+            username="author", email="author@yandex.ru", password="password"
+        )
+        self.old_post = Post.objects.create(
+            text="Written before the follow", author=self.author
+        )
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def timeline_posts(self):
+        return set(
+            TimelineEntry.objects.filter(user=self.reader).values_list(
+                "post_id", flat=True
+            )
+        )
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        self.client.get(
+            reverse("profile_follow", kwargs={"username": "author"})
+        )
+        self.assertEqual(self.timeline_posts(), {self.old_post.id})
+
+        self.client.get(
+            reverse("profile_unfollow", kwargs={"username": "author"})
+        )
+        self.assertEqual(self.timeline_posts(), set())
+
+    def test_new_post_is_fanned_out(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(
+            text="Written after the follow", author=self.author
+        )
+        self.assertEqual(
+            self.timeline_posts(), {self.old_post.id, new_post.id}
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_is_merged_on_read(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(
+            text="Written by a popular author", author=self.author
+        )
+        self.assertEqual(self.timeline_posts(), set())
+
+        response = self.client.get(reverse("follow_index"))
+        self.assertEqual(
+            [post.id for post in response.context["page"]],
+            [new_post.id, self.old_post.id],
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_posts_from_both_sides_fill_the_page(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        for number in range(4):
+            Post.objects.create(text=f"Post {number}", author=self.author)
+        # Fanned out before the author became popular
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(
+                user=self.reader,
+                post=post,
+                author=self.author,
+                pub_date=post.pub_date,
+            )
+            for post in Post.objects.all()
+        )
+
+        paginator = TimelinePaginator(self.reader, 2)
+        seen = []
+        page = paginator.get_page()
+        while True:
+            seen.extend(post.id for post in page)
+            if not page.has_next():
+                break
+            page = paginator.get_page(page.next_cursor)
+        self.assertEqual(
+            seen,
+            list(
+                Post.objects.order_by("-pub_date", "-id").values_list(
+                    "id", flat=True
+                )
+            ),
+        )
+
+    def test_rebuild(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command("rebuild_timelines", stdout=StringIO())
+        self.assertEqual(self.timeline_posts(), {self.old_post.id})
+
+
+@override_settings(CACHES=settings.TEST_CACHES)
+class TestCommentCounters(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="test_username",
+            email="test_mail@yandex.ru",
+            password="test_password",
+        )
+        self.post = Post.objects.create(
+            text="It is a text of a test post", author=self.user
+        )
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def comment_count(self):
+        return Post.objects.get(pk=self.post.pk).comment_count
+
+    def test_counter_follows_comments(self):
+        comment_url = reverse(
+            "add_comment",
+            kwargs={"username": self.user.username, "post_id": self.post.id},
+        )
+        self.client.post(comment_url, {"text": "first"})
+        self.client.post(comment_url, {"text": "second"})
+        self.assertEqual(self.comment_count(), 2)
+
+        Comment.objects.filter(text="first").delete()
+        self.assertEqual(self.comment_count(), 1)
+
+    def test_reconcile(self):
+        Comment.objects.create(
+            text="comment", post=self.post, author=self.user
+        )
+        Post.objects.update(comment_count=42)
+        call_command("reconcile_comment_counts", stdout=StringIO())
+        self.assertEqual(self.comment_count(), 1)
+
+    def test_feed_query_count_is_fixed(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse("index"))
+            return len(queries)
+
+        few = count_queries()
+        for number in range(9):
+            post = Post.objects.create(text=f"Post {number}", author=self.user)
+            Comment.objects.create(text="comment", post=post, author=self.user)
+        self.assertEqual(
+            count_queries(), few, "Feed queries should not grow with posts"
+        )
+
+
+@override_settings(CACHES=settings.TEST_CACHES)
+class TestProfileCounters(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username="author", email="author@yandex.ru", password="password"
+        )
+        Post.objects.create(text="The only post", author=self.author)
+        self.profile_url = reverse("profile", kwargs={"username": "author"})
+        self.client = Client()
+
+    def add_followers(self, number):
+        start = User.objects.count()
+        for index in range(start, start + number):
+            follower = User.objects.create_user(
+                username=f"follower{index}", password="password"
+            )
+            Follow.objects.create(user=follower, author=self.author)
+
+    def test_counters(self):
+        self.add_followers(3)
+        Follow.objects.filter(user__username="follower1").delete()
+        profile = Profile.objects.get(user=self.author)
+        self.assertEqual(profile.followers_count, 2)
+        self.assertEqual(profile.posts_count, 1)
+
+        response = self.client.get(self.profile_url)
+        self.assertContains(response, "Подписчиков: 2")
+        self.assertContains(response, "Записей: 1")
+
+    def test_follow_state(self):
+        self.add_followers(1)
+        follower = User.objects.get(username="follower1")
+        self.client.force_login(follower)
+        response = self.client.get(self.profile_url)
+        self.assertTrue(response.context["following"])
+
+    def test_query_count_does_not_depend_on_audience(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(self.profile_url)
+            return len(queries)
+
+        self.add_followers(1)
+        few = count_queries()
+        self.add_followers(10)
+        self.assertEqual(count_queries(), few)
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "conditional-get",
+        }
+    }
+)
+class TestConditionalGet(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="test_username",
+            email="test_mail@yandex.ru",
+            password="test_password",
+        )
+        self.post = Post.objects.create(
+            text="It is a text of a test post", author=self.user
+        )
+        self.client = Client()
+
+    def test_etag(self):
+        urls = [
+            reverse("index"),
+            reverse("profile", kwargs={"username": self.user.username}),
+            reverse(
+                "post",
+                kwargs={
+                    "username": self.user.username,
+                    "post_id": self.post.id,
+                },
+            ),
+        ]
+        for url in urls:
+            etag = self.client.get(url)["ETag"]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertFalse(
+                any("LIMIT 11" in query["sql"] for query in queries),
+                "304 response should not paginate",
+            )
+
+        etag = self.client.get(urls[0])["ETag"]
+        self.post.text = "Edited text"
+        self.post.save()
+        response = self.client.get(urls[0], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_dates_are_not_validators(self):
+        response = self.client.get(reverse("index"))
+        self.assertFalse(response.has_header("Last-Modified"))
+
+        # The newest post date does not move with a new comment
+        Comment.objects.create(
+            text="comment", post=self.post, author=self.user
+        )
+        response = self.client.get(
+            reverse("index"), HTTP_IF_MODIFIED_SINCE=http_date()
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=settings.TEST_CACHES)
+class TestSearch(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="test_username",
+            email="test_mail@yandex.ru",
+            password="test_password",
+        )
+        self.post = Post.objects.create(
+            text="Ёжик ходил в туман за малиной", author=self.user
+        )
+        Post.objects.create(text="Совсем другая запись", author=self.user)
+        self.comment = Comment.objects.create(
+            text="Туманный комментарий", post=self.post, author=self.user
+        )
+        self.client = Client()
+
+    def search(self, query):
+        return self.client.get(reverse("search"), {"q": query}).context
+
+    def test_finds_posts_and_comments(self):
+        context = self.search("туман")
+        self.assertEqual(context["posts"], [self.post])
+        self.assertEqual(context["comments"], [self.comment])
+        self.assertEqual(self.search('малиной" (')["posts"], [self.post])
+
+    def test_index_follows_changes(self):
+        self.post.text = "Переписанная запись"
+        self.post.save()
+        self.assertEqual(self.search("туман")["posts"], [])
+        self.assertEqual(self.search("переписанная")["posts"], [self.post])
+
+        self.comment.delete()
+        self.assertEqual(self.search("туманный")["comments"], [])
+
+    def test_rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM posts_post_fts")
+        self.assertEqual(self.search("туман")["posts"], [])
+        call_command("rebuild_search_index", chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.search("туман")["posts"], [self.post])
+
+    def test_writes_during_rebuild_are_kept(self):
+        edited = []
+
+        def edit_after_first_chunk(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if "_rebuild (rowid, text) SELECT" in sql and not edited:
+                edited.append(sql)
+                # Bypasses the signals, only the triggers see it
+                Post.objects.filter(pk=self.post.pk).update(
+                    text="Переписанная запись"
+                )
+            return result
+
+        with connection.execute_wrapper(edit_after_first_chunk):
+            search.rebuild(Post, chunk_size=1)
+        self.assertEqual(self.search("туман")["posts"], [])
+        self.assertEqual(self.search("переписанная")["posts"], [self.post])
+
+    def test_admin_searches_the_index(self):
+        admin = User.objects.create_superuser(
+            username="admin", email="admin@yandex.ru", password="admin"
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse("admin:posts_post_changelist"), {"q": "малиной"}
+        )
+        self.assertEqual(list(response.context["cl"].result_list), [self.post])
+
+
+@override_settings(CACHES=settings.TEST_CACHES)
+class TestLoadData(TestCase):
+    def test_generate_and_benchmark(self):
+        call_command(
+            "generate_load_data",
+            users=20,
+            groups=2,
+            posts=60,
+            follows=80,
+            comments=50,
+            stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 50)
+        self.assertEqual(
+            Profile.objects.filter(posts_count__gt=0).count(),
+            Post.objects.values("author").distinct().count(),
+        )
+        self.assertTrue(TimelineEntry.objects.exists())
+        follows = Follow.objects.count()
+
+        report_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, report_dir)
+        report_path = os.path.join(report_dir, "report.json")
+        call_command(
+            "benchmark", repeat=2, output=report_path, stdout=StringIO()
+        )
+        with open(report_path) as report_file:
+            report = json.load(report_file)
+        self.assertEqual(report["routes"]["index"]["status"], 200)
+        self.assertEqual(report["routes"]["follow_index"]["status"], 200)
+        self.assertIn("p95_ms", report["routes"]["post"])
+        self.assertEqual(Follow.objects.count(), follows)
+
+
+@override_settings(CACHES=settings.TEST_CACHES)
+class TestContentTransfer(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="test_username", password="test_password"
+        )
+        self.reader = User.objects.create_user(
+            username="reader", password="test_password"
+        )
+        self.group = Group.objects.create(
+            title="group title", slug="group-slug", description="description"
+        )
+        self.post = Post.objects.create(
+            text="Exported post", author=self.user, group=self.group
+        )
+        Comment.objects.create(
+            text="Exported comment", post=self.post, author=self.reader
+        )
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.dump_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dump_dir)
+
+    def test_round_trip(self):
+        dump = os.path.join(self.dump_dir, "content.jsonl.gz")
+        call_command("export_content", dump, stderr=StringIO())
+        pub_date = self.post.pub_date
+
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        call_command(
+            "import_content", dump, create_users=True, stdout=StringIO()
+        )
+
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.pub_date, pub_date)
+        self.assertEqual(post.author.username, "test_username")
+        self.assertEqual(post.group.slug, "group-slug")
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(post.comments.get().author.username, "reader")
+        self.assertTrue(
+            Follow.objects.filter(
+                user__username="reader", author__username="test_username"
+            ).exists()
+        )
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user__username="reader", post=post
+            ).exists()
+        )
+
+        # Importing again keeps the rows as they are
+        call_command("import_content", dump, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_edited_posts_are_updated(self):
+        importer = Importer()
+        importer.load(export_lines())
+        self.assertEqual(importer.present["posts.post"], 1)
+        self.assertEqual(importer.updated["posts.post"], 0)
+
+        # Edited and commented on the source after the first copy
+        Post.objects.filter(pk=self.post.pk).update(
+            text="Edited post", group=None
+        )
+        comment = Comment.objects.create(
+            text="New comment", post=self.post, author=self.user
+        )
+        lines = list(export_lines())
+        Post.objects.filter(pk=self.post.pk).update(
+            text="Exported post", group=self.group
+        )
+        Comment.objects.filter(pk=comment.pk).delete()
+
+        importer = Importer()
+        importer.load(lines)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text, "Edited post")
+        self.assertIsNone(post.group)
+        self.assertEqual(importer.updated["posts.post"], 1)
+        self.assertEqual(importer.conflicting["posts.post"], 0)
+        self.assertEqual(importer.imported["posts.comment"], 1)
+        self.assertTrue(post.comments.filter(text="New comment").exists())
+
+    def test_taken_ids_are_refused(self):
+        lines = list(export_lines())
+        Comment.objects.all().delete()
+        Post.objects.all().delete()
+        # Another post holds the exported id on the target database
+        Post.objects.create(
+            id=self.post.pk, text="Another post", author=self.reader
+        )
+
+        importer = Importer()
+        importer.load(lines)
+        other = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(other.text, "Another post")
+        self.assertFalse(other.comments.exists())
+        self.assertEqual(importer.imported["posts.post"], 0)
+        self.assertEqual(importer.conflicting["posts.post"], 1)
+        self.assertEqual(importer.skipped["posts.comment"], 1)
+        self.assertEqual(importer.imported["posts.follow"], 0)
+        self.assertEqual(importer.present["posts.follow"], 1)
+
+
+@override_settings(CACHES=settings.TEST_CACHES)
+class TestApi(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="test_username", password="test_password"
+        )
+        self.group = Group.objects.create(
+            title="group title", slug="group-slug", description="description"
+        )
+        self.posts = [
+            Post.objects.create(
+                text=f"Post {number}", author=self.user, group=self.group
+            )
+            for number in range(5)
+        ]
+        self.client = Client()
+
+    def get_json(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response["Content-Type"], "application/json")
+        return response, json.loads(b"".join(response.streaming_content))
+
+    def test_feed_pages(self):
+        url = reverse("api:group_page", kwargs={"slug": self.group.slug})
+        _, page = self.get_json(url, limit=3)
+        self.assertEqual(
+            [item["id"] for item in page["results"]],
+            [post.id for post in self.posts[:-4:-1]],
+        )
+        self.assertEqual(
+            page["results"][0],
+            {
+                "id": self.posts[-1].id,
+                "text": "Post 4",
+                "pub_date": self.posts[-1].pub_date.isoformat(),
+                "author": "test_username",
+                "group": "group-slug",
+                "thumbnail": None,
+                "comment_count": 0,
+            },
+        )
+        self.assertIsNone(page["previous"])
+
+        _, page = self.get_json(url, limit=3, cursor=page["next"])
+        self.assertEqual(
+            [item["id"] for item in page["results"]],
+            [self.posts[1].id, self.posts[0].id],
+        )
+        self.assertIsNone(page["next"])
+
+    def test_follow_feed_requires_login(self):
+        response = self.client.get(reverse("api:follow_index"))
+        self.assertEqual(response.status_code, 401)
+
+        reader = User.objects.create_user(username="reader", password="pw")
+        Follow.objects.create(user=reader, author=self.user)
+        self.client.force_login(reader)
+        _, page = self.get_json(reverse("api:follow_index"))
+        self.assertEqual(len(page["results"]), 5)
+
+    def test_post(self):
+        post = self.posts[0]
+        response = self.client.get(
+            reverse(
+                "api:post",
+                kwargs={"username": self.user.username, "post_id": post.id},
+            )
+        )
+        data = response.json()
+        self.assertEqual(data["post"]["id"], post.id)
+        self.assertEqual(data["author"]["posts_count"], 5)
+
+        response = self.client.get(
+            reverse("api:profile", kwargs={"username": "nobody"})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=settings.TEST_CACHES, COMMENTS_PAGE_SIZE=20)
+class TestCommentPages(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="test_username", password="test_password"
+        )
+        self.post = Post.objects.create(text="Viral post", author=self.user)
+        for number in range(25):
+            Comment.objects.create(
+                text=f"Comment number {number}.",
+                post=self.post,
+                author=self.user,
+            )
+        self.client = Client()
+
+    def test_comments_are_paged(self):
+        kwargs = {"username": self.user.username, "post_id": self.post.id}
+        response = self.client.get(reverse("post", kwargs=kwargs))
+        comments = response.context["comments"]
+        self.assertEqual(len(comments), 20)
+        self.assertContains(response, "Comment number 24.")
+        self.assertNotContains(response, "Comment number 4.")
+
+        response = self.client.get(
+            reverse("post_comments", kwargs=kwargs),
+            {"cursor": comments.next_cursor},
+        )
+        self.assertEqual(
+            [comment.text for comment in response.context["comments"]],
+            [f"Comment number {number}." for number in range(4, -1, -1)],
+        )
+        self.assertNotContains(response, "<html")
+        self.assertNotContains(response, "data-fragment")
+
+
+@override_settings(
+    CACHES=settings.TEST_CACHES, DATABASE_REPLICAS=["replica"]
+)
+class TestReplicaRouting(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="test_username", password="test_password"
+        )
+        Post.objects.create(text="Written to the primary", author=self.user)
+        self.client = Client()
+
+    def test_reads_go_to_the_replica(self):
+        # Nothing copies the rows to the stand-in replica
+        response = self.client.get(reverse("index"))
+        self.assertNotContains(response, "Written to the primary")
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+        response = self.client.get(
+            reverse("profile", kwargs={"username": self.user.username})
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_writer_is_pinned_to_the_primary(self):
+        self.client.login(username="test_username", password="test_password")
+        self.client.post(reverse("new_post"), {"text": "Fresh post"})
+        self.assertIn(settings.REPLICA_PIN_COOKIE, self.client.cookies)
+
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "Fresh post")
+        self.assertContains(response, "Written to the primary")
+
+        del self.client.cookies[settings.REPLICA_PIN_COOKIE]
+        response = self.client.get(reverse("index"))
+        self.assertNotContains(response, "Fresh post")
+
+
+@override_settings(CACHES=settings.TEST_CACHES)
+class TestGroupStats(TestCase):
+    def setUp(self):
+        self.first = User.objects.create_user(username="first", password="1")
+        self.second = User.objects.create_user(username="second", password="2")
+        self.group = Group.objects.create(
+            title="Cooking", slug="cooking", description="Recipes"
+        )
+        self.other_group = Group.objects.create(
+            title="Travel", slug="travel", description="Trips"
+        )
+        self.old_post = Post.objects.create(
+            text="Old", author=self.first, group=self.group
+        )
+        self.new_post = Post.objects.create(
+            text="New", author=self.second, group=self.group
+        )
+
+    def stats(self, group):
+        return GroupStats.objects.get(group=group)
+
+    def test_summary_follows_posts(self):
+        stats = self.stats(self.group)
+        self.assertEqual(stats.posts_count, 2)
+        self.assertEqual(stats.last_post_at, self.new_post.pub_date)
+        self.assertEqual(
+            stats.contributor_ids, [self.second.id, self.first.id]
+        )
+
+        post = Post.objects.get(pk=self.new_post.pk)
+        post.group = self.other_group
+        post.save()
+        stats = self.stats(self.group)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.last_post_at, self.old_post.pub_date)
+        self.assertEqual(stats.contributor_ids, [self.first.id])
+        self.assertEqual(self.stats(self.other_group).posts_count, 1)
+
+        self.old_post.delete()
+        stats = self.stats(self.group)
+        self.assertEqual(stats.posts_count, 0)
+        self.assertIsNone(stats.last_post_at)
+        self.assertEqual(stats.contributor_ids, [])
+
+    def test_instance_saved_again(self):
+        for post in (Post.objects.get(pk=self.new_post.pk), self.new_post):
+            post.group = self.other_group
+            post.save()
+            post.save()
+            post.group = None
+            post.save()
+            post.save()
+            self.assertEqual(self.stats(self.group).posts_count, 1)
+            self.assertEqual(self.stats(self.other_group).posts_count, 0)
+            post.group = self.group
+            post.save()
+
+    def test_deleted_group(self):
+        self.group.delete()
+        self.assertFalse(GroupStats.objects.filter(group_id=self.group.id))
+        self.assertEqual(Post.objects.filter(group__isnull=True).count(), 2)
+
+    def test_reconcile(self):
+        GroupStats.objects.filter(group=self.group).update(
+            posts_count=7, recent_contributors=""
+        )
+        GroupStats.objects.filter(group=self.other_group).delete()
+        out = StringIO()
+        call_command("reconcile_group_stats", stdout=out)
+        self.assertIn("Fixed 2 group summaries", out.getvalue())
+        stats = self.stats(self.group)
+        self.assertEqual(stats.posts_count, 2)
+        self.assertEqual(
+            stats.contributor_ids, [self.second.id, self.first.id]
+        )
+        self.assertEqual(self.stats(self.other_group).posts_count, 0)
+
+    def test_directory(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("groups"))
+        self.assertContains(response, "#Cooking")
+        self.assertContains(response, "@second")
+        self.assertFalse(
+            any('FROM "posts_post"' in query["sql"] for query in queries),
+            "The directory should not count posts",
+        )
+
+        response = self.client.get(
+            reverse("group_page", kwargs={"slug": self.group.slug})
+        )
+        self.assertContains(response, "Записей: 2")
+
+
+@override_settings(CACHES=settings.TEST_CACHES)
+class TestRecommendations(TestCase):
+    def setUp(self):
+        self.reader, self.friend, self.writer, self.lurker = [
+            User.objects.create_user(username=name, password=name)
+            for name in ("reader", "friend", "writer", "lurker")
+        ]
+        Post.objects.create(text="Worth reading", author=self.writer)
+        Post.objects.create(text="Me too", author=self.friend)
+        for user, author in (
+            (self.reader, self.friend),
+            (self.friend, self.writer),
+            (self.friend, self.lurker),
+            (self.lurker, self.friend),
+            (self.lurker, self.writer),
+        ):
+            Follow.objects.create(user=user, author=author)
+
+    def test_graph(self):
+        graph = Graph(array("i", [1, 2, 2, 4, 4]), array("i", [2, 3, 4, 2, 3]))
+        # 2 follows 3, and 4 who shares 2 with user 1 follows 3 too
+        self.assertEqual(graph.suggest(1, 10), [(3, 3), (4, 2)])
+        self.assertEqual(graph.suggest(1, 1), [(3, 3)])
+        self.assertEqual(graph.suggest(3, 10), [])
+        self.assertEqual(
+            list(compute(graph, workers=2, top_k=10)),
+            list(compute(graph, top_k=10)),
+        )
+
+    def test_suggestions(self):
+        out = StringIO()
+        call_command("compute_recommendations", stdout=out)
+        self.assertIn("Stored", out.getvalue())
+        suggested = Suggestion.objects.filter(user=self.reader)
+        # The lurker has no posts to read
+        self.assertEqual(
+            list(suggested.values_list("author__username", "score")),
+            [("writer", 3)],
+        )
+
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse("follow_index"))
+        self.assertContains(response, "Кого почитать")
+        self.assertContains(
+            response,
+            reverse("profile_follow", kwargs={"username": "writer"}),
+        )
+        response = self.client.get(
+            reverse("profile", kwargs={"username": "reader"})
+        )
+        self.assertContains(response, "@writer")
+
+        self.client.get(
+            reverse("profile_follow", kwargs={"username": "writer"})
+        )
+        self.assertFalse(suggested.exists())
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "trending-tests",
+        }
+    },
+    TRENDING_HALF_LIFE=100,
+)
+class TestTrending(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="writer", password="1")
+        self.client.force_login(self.user)
+        self.client.post(reverse("new_post"), {"text": "Quiet post"})
+        self.client.post(reverse("new_post"), {"text": "Hot post"})
+        self.quiet, self.hot = Post.objects.order_by("id")
+
+    def test_decayed_increments(self):
+        TrendingScore.objects.all().delete()
+        trending.record(self.quiet.id, 1, now=1000)
+        trending.record(self.quiet.id, 1, now=1100)
+        trending.record(self.quiet.id, 1, now=1100)
+        score = TrendingScore.objects.get(post=self.quiet)
+        # The first increment was halved once
+        self.assertAlmostEqual(score.score, 2.5)
+        self.assertEqual(score.updated, 1100)
+        self.assertEqual(trending.rank(1, now=1100), [self.quiet.id])
+
+    def test_trending_page(self):
+        comment_url = reverse(
+            "add_comment",
+            kwargs={"username": self.user.username, "post_id": self.hot.id},
+        )
+        for number in range(3):
+            self.client.post(comment_url, {"text": f"Comment {number}"})
+        response = self.client.get(reverse("trending"))
+        content = response.content.decode()
+        self.assertLess(content.index("Hot post"), content.index("Quiet post"))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("trending"))
+        self.assertFalse(
+            any("posts_trendingscore" in query["sql"] for query in queries),
+            "The trending list should be served from the cache",
+        )
+
+    def test_decay(self):
+        TrendingScore.objects.filter(post=self.quiet).update(updated=0)
+        out = StringIO()
+        call_command("decay_trending", stdout=out)
+        self.assertIn("Dropped 1 posts", out.getvalue())
+        self.assertEqual(trending.top_post_ids(), [self.hot.id])
+        with self.settings(TRENDING_MAX_POSTS=0):
+            trending.decay()
+        self.assertFalse(TrendingScore.objects.exists())
+
+
+class TestAdminChangelist(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username="admin", email="admin@yandex.ru", password="admin"
+        )
+        self.client.force_login(self.admin)
+        group = Group.objects.create(title="Group", slug="group")
+        Post.objects.bulk_create(
+            Post(text=f"Post {number}", author=self.admin, group=group)
+            for number in range(150)
+        )
+        self.url = reverse("admin:posts_post_changelist")
+
+    def test_keyset_navigation(self):
+        response = self.client.get(self.url)
+        cl = response.context["cl"]
+        newest = list(Post.objects.order_by("-pub_date", "-id")[:100])
+        self.assertEqual(list(cl.result_list), newest)
+        self.assertIsNone(cl.previous_url)
+        self.assertTrue(cl.result_count_estimated)
+
+        response = self.client.get(self.url + cl.next_url)
+        cl = response.context["cl"]
+        self.assertEqual(len(cl.result_list), 50)
+        self.assertIsNone(cl.next_url)
+        self.assertIn("cursor=", cl.previous_url)
+        # Filter links start over from the first slice
+        self.assertNotIn("cursor", cl.get_query_string({"q": "Post"}))
+
+    def test_counts_without_scanning(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.context["cl"].result_count, 150)
+        self.assertFalse(
+            any("COUNT(" in query["sql"] for query in queries),
+            "The unfiltered changelist should not count rows",
+        )
+        # Groups are joined instead of fetched row by row
+        self.assertFalse(
+            any(q["sql"].startswith('SELECT "posts_group"') for q in queries)
+        )
+
+        with self.settings(ADMIN_COUNT_LIMIT=100):
+            response = self.client.get(
+                self.url, {"pub_date__gte": "2000-01-01 00:00+00:00"}
+            )
+        cl = response.context["cl"]
+        self.assertEqual(cl.result_count, 100)
+        self.assertTrue(cl.result_count_capped)
+        self.assertContains(response, "100+")
+
+
+class TestQueryPlans(TestCase):
+    def test_views_use_indexes(self):
+        call_command(
+            "generate_load_data",
+            users=20,
+            groups=2,
+            posts=60,
+            follows=80,
+            comments=50,
+            stdout=StringIO(),
+        )
+        out = StringIO()
+        call_command("explain_queries", stdout=out)
+        self.assertIn("group_page /group/", out.getvalue())
+        self.assertIn("api:post /api/v1/", out.getvalue())
+
+    def test_flags_scans_and_sorts(self):
+        tables = {"posts_post"}
+        plan = query_plans.explain(
+            "default", "SELECT id FROM posts_post ORDER BY text", []
+        )
+        # Older SQLite versions say "SCAN TABLE posts_post"
+        scan, sort = query_plans.problems(plan, tables)
+        self.assertIn("posts_post", scan)
+        self.assertEqual(sort, "USE TEMP B-TREE FOR ORDER BY")
+        plan = query_plans.explain(
+            "default",
+            "SELECT id FROM posts_post WHERE author_id = %s "
+            "ORDER BY pub_date DESC, id DESC",
+            [1],
         )
+        self.assertEqual(query_plans.problems(plan, tables), [])
@@ -0,0 +1,105 @@
+"""
+Thumbnails of post images are generated ahead of time, out of requests.
+
+`new_post` and `post_edit` enqueue a `ThumbnailJob` for every geometry
+in `GEOMETRIES`, and the `thumbnail_worker` command drains the queue.
+Templates only look up thumbnails that already exist and show
+the original image until then, so the pages showing the post are
+invalidated once its thumbnail is ready.
+"""
+
+import logging
+
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import feed_cache
+from .models import ThumbnailJob
+
+logger = logging.getLogger(__name__)
+
+# Every geometry the templates render post images with.
+GEOMETRIES = {
+    "960x339": {"crop": "center", "upscale": True},
+}
+
+MAX_ATTEMPTS = 3
+
+
+def _full_options(source, options):
+    """
+    Completes `options` the way `ThumbnailBackend.get_thumbnail` does,
+    so the thumbnail name comes out the same.
+    """
+    backend = default.backend
+    options = dict(options)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault("format", backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def existing_thumbnail(image, geometry):
+    """
+    Returns the thumbnail of `image` if it has already been generated,
+    `None` otherwise. Never decodes the image.
+    """
+    if not image:
+        return None
+    source = ImageFile(image)
+    options = _full_options(source, GEOMETRIES[geometry])
+    name = default.backend._get_thumbnail_filename(source, geometry, options)
+    return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def generate(image, geometry):
+    return get_thumbnail(image, geometry, **GEOMETRIES[geometry])
+
+
+def enqueue(post):
+    """
+    Schedules thumbnails of every geometry for the image of `post`.
+    """
+    if not post.image:
+        return
+    ThumbnailJob.objects.bulk_create(
+        [
+            ThumbnailJob(post=post, geometry=geometry)
+            for geometry in GEOMETRIES
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def drain(batch_size=20):
+    """
+    Generates thumbnails for a batch of queued jobs.
+    Returns the number of processed jobs.
+    """
+    jobs = list(
+        ThumbnailJob.objects.select_related("post").order_by("created", "id")[
+            :batch_size
+        ]
+    )
+    for job in jobs:
+        try:
+            if job.post.image and job.geometry in GEOMETRIES:
+                generate(job.post.image, job.geometry)
+                # Cached feeds and their ETags still show the original
+                feed_cache.bump(feed_cache.post_scope(job.post_id))
+        except Exception:
+            logger.exception("Thumbnail of %s failed", job)
+            if job.attempts + 1 < MAX_ATTEMPTS:
+                ThumbnailJob.objects.filter(pk=job.pk).update(
+                    attempts=job.attempts + 1
+                )
+                continue
+        ThumbnailJob.objects.filter(pk=job.pk).delete()
+    return len(jobs)
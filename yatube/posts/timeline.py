@@ -0,0 +1,268 @@
+"""
+Materialized home timelines for `follow_index`.
+
+A new post is pushed to the timeline of each follower of its author
+(fan-out on write), so a follow feed is a single indexed range read.
+Authors followed by more than `TIMELINE_FANOUT_LIMIT` users are exempt:
+their posts are merged into the follow feed on read instead.
+"""
+
+import heapq
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import counters
+from .models import Follow, Post, Profile, TimelineEntry
+from .pagination import WindowedPaginator, keyset_slice
+
+FANOUT_EXEMPT_CACHE_KEY = "timeline:fanout-exempt"
+CHUNK_SIZE = 1000
+
+
+def fanout_exempt_authors():
+    """
+    Returns ids of the authors whose posts are fanned out on read.
+    """
+    return cache.get_or_set(
+        FANOUT_EXEMPT_CACHE_KEY,
+        _count_fanout_exempt_authors,
+        settings.TIMELINE_FANOUT_EXEMPT_TIMEOUT,
+    )
+
+
+def _count_fanout_exempt_authors():
+    return frozenset(
+        Profile.objects.filter(
+            followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+        ).values_list("user_id", flat=True)
+    )
+
+
+def exempt_authors_followed_by(user):
+    """
+    Returns ids of the fan-out-exempt authors `user` is subscribed to.
+    """
+    exempt = fanout_exempt_authors()
+    if not exempt:
+        return []
+    return list(
+        Follow.objects.filter(user=user, author_id__in=exempt).values_list(
+            "author_id", flat=True
+        )
+    )
+
+
+def _entries(user_ids, posts):
+    for user_id in user_ids:
+        for post_id, author_id, pub_date in posts:
+            yield TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+
+
+def _chunked(queryset, size=CHUNK_SIZE):
+    chunk = []
+    for row in queryset.iterator(chunk_size=size):
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def fan_out_post(post):
+    """
+    Pushes a new post to the timelines of its author's followers.
+    """
+    if post.author_id in fanout_exempt_authors():
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        "user_id", flat=True
+    )
+    row = [(post.id, post.author_id, post.pub_date)]
+    for user_ids in _chunked(followers):
+        TimelineEntry.objects.bulk_create(
+            _entries(user_ids, row), ignore_conflicts=True
+        )
+
+
+def backfill(user_id, author_id):
+    """
+    Copies the newest posts of `author_id` into the timeline of `user_id`.
+    """
+    if author_id in fanout_exempt_authors():
+        return
+    posts = list(
+        Post.objects.filter(author_id=author_id)
+        .order_by("-pub_date", "-id")
+        .values_list("id", "author_id", "pub_date")[
+            : settings.TIMELINE_BACKFILL_LIMIT
+        ]
+    )
+    TimelineEntry.objects.bulk_create(
+        _entries([user_id], posts), ignore_conflicts=True
+    )
+
+
+def prune(user_id, author_id):
+    """
+    Removes posts of `author_id` from the timeline of `user_id`.
+    """
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild(stdout=None):
+    """
+    Recreates every timeline from `Follow` and `Post`.
+    Returns the number of written entries.
+    """
+    cache.delete(FANOUT_EXEMPT_CACHE_KEY)
+    exempt = fanout_exempt_authors()
+    TimelineEntry.objects.all().delete()
+
+    written = 0
+    authors = (
+        Follow.objects.exclude(author_id__in=exempt)
+        .order_by("author_id")
+        .values_list("author_id", flat=True)
+        .distinct()
+    )
+    for author_id in authors.iterator():
+        posts = list(
+            Post.objects.filter(author_id=author_id)
+            .order_by("-pub_date", "-id")
+            .values_list("id", "author_id", "pub_date")[
+                : settings.TIMELINE_BACKFILL_LIMIT
+            ]
+        )
+        if not posts:
+            continue
+        followers = Follow.objects.filter(author_id=author_id).values_list(
+            "user_id", flat=True
+        )
+        for user_ids in _chunked(followers):
+            TimelineEntry.objects.bulk_create(
+                _entries(user_ids, posts), ignore_conflicts=True
+            )
+            written += len(user_ids) * len(posts)
+        if stdout is not None:
+            stdout.write(f"author {author_id}: {len(posts)} posts")
+    return written
+
+
+def feed_size(user, exempt_authors):
+    """
+    Returns about how many posts the follow feed of `user` holds,
+    reading at most `APPROXIMATE_COUNT_LIMIT` timeline entries.
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    total = entries[: settings.APPROXIMATE_COUNT_LIMIT].count()
+    if exempt_authors:
+        total += (
+            Profile.objects.filter(user_id__in=exempt_authors).aggregate(
+                total=Sum("posts_count")
+            )["total"]
+            or 0
+        )
+    return total
+
+
+class TimelinePaginator(WindowedPaginator):
+    """
+    Cursor paginator over the materialized timeline of `user`,
+    merged with the posts of the followed fan-out-exempt authors.
+    """
+
+    def __init__(self, user, per_page):
+        posts = Post.objects.select_related("author").select_related("group")
+        super().__init__(
+            posts,
+            per_page,
+            count=lambda: counters.approximate_count(
+                f"timeline:{user.pk}",
+                lambda: feed_size(user, self.exempt_authors),
+            ),
+        )
+        self.entries = TimelineEntry.objects.filter(user=user).select_related(
+            "post__author", "post__group"
+        )
+        self.exempt_authors = exempt_authors_followed_by(user)
+        self.exempt_posts = None
+        if self.exempt_authors:
+            self.exempt_posts = posts.filter(author_id__in=self.exempt_authors)
+
+    def _fetch(self, values, older, limit):
+        if self.exempt_posts is None:
+            return self._timeline_posts(values, older, limit)
+
+        # An author might have been fanned out on write before reaching
+        # the limit, so the same post can come from both sides. Slices
+        # are read again, twice as long, until `limit` distinct posts
+        # are known or both sides run out.
+        size = limit
+        while True:
+            posts = self._timeline_posts(values, older, size)
+            pulled = list(
+                keyset_slice(self.exempt_posts, self.keys, values, older, size)
+            )
+            # Past the last post of a full slice, the unread rest
+            # of that side could come before the merged posts
+            ends = [
+                self.key(side[-1])
+                for side in (posts, pulled)
+                if len(side) == size
+            ]
+            bound = (max if older else min)(ends) if ends else None
+            result = []
+            seen = set()
+            for post in heapq.merge(
+                posts, pulled, key=self.key, reverse=older
+            ):
+                if bound is not None and (
+                    self.key(post) < bound if older else self.key(post) > bound
+                ):
+                    break
+                if post.id in seen:
+                    continue
+                seen.add(post.id)
+                result.append(post)
+                if len(result) == limit:
+                    return result
+            if bound is None:
+                return result
+            size *= 2
+
+    def _timeline_posts(self, values, older, limit):
+        return [
+            entry.post
+            for entry in keyset_slice(
+                self.entries, ("pub_date", "post_id"), values, older, limit
+            )
+        ]
+
+
+@receiver(post_save, sender=Post)
+def fan_out_on_create(**kwargs):
+    if kwargs["created"] and not kwargs["raw"]:
+        fan_out_post(kwargs["instance"])
+
+
+@receiver(post_save, sender=Follow)
+def backfill_on_follow(**kwargs):
+    if kwargs["created"] and not kwargs["raw"]:
+        follow = kwargs["instance"]
+        backfill(follow.user_id, follow.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_on_unfollow(**kwargs):
+    follow = kwargs["instance"]
+    prune(follow.user_id, follow.author_id)
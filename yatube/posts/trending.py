@@ -0,0 +1,136 @@
+"""
+Trending posts, ranked by time-decayed engagement.
+
+Every new post and comment adds to the score of its post, and scores
+halve every `TRENDING_HALF_LIFE` seconds. A `TrendingScore` row holds
+the score as of its `updated` timestamp, so an increment is a single
+UPDATE decaying the stored score and adding to it. Rows nobody touched
+keep a score higher than their current one until `decay_trending`
+brings every row up to date and drops the posts that cooled down.
+
+The ranked list is cached for `TRENDING_CACHE_TIMEOUT` seconds, so the
+trending page costs one cache read and one query by primary key.
+"""
+
+import heapq
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q, Value
+from django.db.models.functions import Power
+
+from .models import TrendingScore
+
+CACHE_KEY = "trending:top"
+CHUNK_SIZE = 200
+
+
+def _decayed(now):
+    """
+    Expression of the stored score decayed up to `now`.
+    """
+    elapsed = Value(now) - F("updated")
+    half_lives = elapsed / Value(float(settings.TRENDING_HALF_LIFE))
+    return F("score") * Power(Value(0.5), half_lives)
+
+
+def decayed(score, updated, now):
+    return score * 0.5 ** ((now - updated) / settings.TRENDING_HALF_LIFE)
+
+
+def record(post_id, weight, now=None):
+    """
+    Adds `weight` to the score of a post.
+    """
+    now = time.time() if now is None else now
+    rows = TrendingScore.objects.filter(post_id=post_id)
+    changes = {"score": _decayed(now) + Value(float(weight)), "updated": now}
+    if rows.update(**changes):
+        return
+    _, created = TrendingScore.objects.get_or_create(
+        post_id=post_id, defaults={"score": weight, "updated": now}
+    )
+    if not created:
+        rows.update(**changes)
+
+
+def record_post(post):
+    record(post.pk, settings.TRENDING_POST_WEIGHT)
+
+
+def record_comment(comment):
+    record(comment.post_id, settings.TRENDING_COMMENT_WEIGHT)
+
+
+def rank(limit, now=None):
+    """
+    Returns the ids of the `limit` hottest posts, hottest first.
+
+    Rows are read by stored score, which is never below the current
+    one, until it falls under the current score of the last kept post.
+    """
+    now = time.time() if now is None else now
+    rows = TrendingScore.objects.order_by("-score", "-post_id").values_list(
+        "post_id", "score", "updated"
+    )
+    best = []
+    start = 0
+    while True:
+        chunk = rows[start : start + CHUNK_SIZE]
+        for post_id, score, updated in chunk:
+            if len(best) == limit and score <= best[0][0]:
+                return _ids(best)
+            entry = (decayed(score, updated, now), post_id)
+            if len(best) < limit:
+                heapq.heappush(best, entry)
+            else:
+                heapq.heappushpop(best, entry)
+        if len(chunk) < CHUNK_SIZE:
+            return _ids(best)
+        start += CHUNK_SIZE
+
+
+def _ids(best):
+    return [post_id for _, post_id in sorted(best, reverse=True)]
+
+
+def top_post_ids():
+    """
+    Returns the cached ids of the trending posts.
+    """
+    ids = cache.get(CACHE_KEY)
+    if ids is None:
+        ids = rank(settings.TRENDING_SIZE)
+        cache.set(CACHE_KEY, ids, settings.TRENDING_CACHE_TIMEOUT)
+    return ids
+
+
+def decay(now=None):
+    """
+    Brings every score up to date, then drops the posts below
+    `TRENDING_MIN_SCORE` and those beyond the `TRENDING_MAX_POSTS` best.
+    Returns the number of dropped posts.
+    """
+    now = time.time() if now is None else now
+    TrendingScore.objects.update(score=_decayed(now), updated=now)
+    dropped, _ = TrendingScore.objects.filter(
+        score__lt=settings.TRENDING_MIN_SCORE
+    ).delete()
+    cutoff = (
+        TrendingScore.objects.order_by("-score", "-post_id")
+        .values_list("score", "post_id")[settings.TRENDING_MAX_POSTS :]
+        .first()
+    )
+    if cutoff is not None:
+        score, post_id = cutoff
+        beyond, _ = TrendingScore.objects.filter(
+            Q(score__lt=score) | Q(score=score, post_id__lte=post_id)
+        ).delete()
+        dropped += beyond
+    cache.set(
+        CACHE_KEY,
+        rank(settings.TRENDING_SIZE, now),
+        settings.TRENDING_CACHE_TIMEOUT,
+    )
+    return dropped
@@ -4,9 +4,12 @@ from . import views
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("groups/", views.group_index, name="groups"),
     path("group/<slug:slug>/", views.group_posts, name="group_page"),
     path("new/", views.new_post, name="new_post"),
     path("follow/", views.follow_index, name="follow_index"),
+    path("trending/", views.trending_posts, name="trending"),
+    path("search/", views.search_results, name="search"),
     path("<username>/", views.profile, name="profile"),
     path("<username>/follow/", views.profile_follow, name="profile_follow"),
     path(
@@ -14,6 +17,11 @@ urlpatterns = [
     ),
     path("<username>/<int:post_id>/", views.post_view, name="post"),
     path("<username>/<int:post_id>/edit/", views.post_edit, name="post_edit"),
+    path(
+        "<username>/<int:post_id>/comments/",
+        views.post_comments,
+        name="post_comments",
+    ),
     path(
         "<username>/<int:post_id>/comment/",
         views.add_comment,
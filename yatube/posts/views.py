@@ -1,32 +1,82 @@
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.db import transaction
+from django.views.decorators.http import condition
+from yatube.routers import use_replica
 
 # from django.http import HttpResponse
 
-from .models import Post, Group, Comment, Follow
+from .models import Post, Group, GroupStats, Comment, Follow
+from . import (
+    conditional,
+    feed_cache,
+    recommendations,
+    search,
+    thumbnails,
+    trending,
+)
+from .counters import (
+    approximate_count,
+    estimated_count,
+    group_stats_for,
+    profile_for,
+)
 from .forms import PostForm, CommentForm
+from .pagination import CursorPaginator, WindowedPaginator
+from .timeline import TimelinePaginator
 
 User = get_user_model()
 
 
+@use_replica
+@condition(etag_func=conditional.index_etag)
 def index(request):
-    post_list = (
-        Post.objects.select_related("author")
-        .select_related("group")
-        .order_by("-pub_date")
-        .all()
+    post_list = Post.objects.select_related("author").select_related("group")
+    paginator = WindowedPaginator(
+        post_list,
+        10,
+        count=lambda: approximate_count(
+            "posts", lambda: estimated_count(Post)
+        ),
+    )
+    page = paginator.get_page(request.GET.get("cursor"))
+    return render(
+        request,
+        "index.html",
+        {
+            "page": page,
+            "paginator": paginator,
+            "cache_version": feed_cache.versions(feed_cache.SITE),
+        },
     )
-    paginator = Paginator(post_list, 10)
 
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+
+@use_replica
+def group_index(request):
+    summaries = GroupStats.objects.select_related("group")
+    paginator = CursorPaginator(
+        summaries, settings.GROUPS_PAGE_SIZE, keys=("posts_count", "group")
+    )
+    page = paginator.get_page(request.GET.get("cursor"))
+    # Contributors of the whole page are read with one query
+    contributors = User.objects.only("username").in_bulk(
+        {pk for summary in page for pk in summary.contributor_ids}
+    )
+    for summary in page:
+        summary.contributors = [
+            contributors[pk]
+            for pk in summary.contributor_ids
+            if pk in contributors
+        ]
     return render(
-        request, "index.html", {"page": page, "paginator": paginator}
+        request, "groups.html", {"page": page, "paginator": paginator}
     )
 
 
+@use_replica
+@condition(etag_func=conditional.group_etag)
 def group_posts(request, slug):
     # функция get_object_or_404 позволяет получить объект из базы данных
     # по заданным критериям или вернуть сообщение об ошибке если объект не найден
@@ -36,38 +86,38 @@ def group_posts(request, slug):
         Post.objects.select_related("author")
         .select_related("group")
         .filter(group=group)
-        .order_by("-pub_date")
-        .all()
     )
-    paginator = Paginator(post_list, 10)
-
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    stats = group_stats_for(group)
+    paginator = WindowedPaginator(post_list, 10, count=stats.posts_count)
+    page = paginator.get_page(request.GET.get("cursor"))
     return render(
         request,
         "group.html",
-        {"group": group, "page": page, "paginator": paginator},
+        {
+            "group": group,
+            "stats": stats,
+            "page": page,
+            "paginator": paginator,
+            "cache_version": feed_cache.versions(
+                feed_cache.group_scope(group.id)
+            ),
+        },
     )
 
 
+@use_replica
+@condition(etag_func=conditional.profile_etag)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    author_followers = author.following.all()
-    followers_as_users = []
-    for follower in author_followers:
-        followers_as_users.append(follower.user)
 
     post_list = (
         Post.objects.select_related("author")
         .select_related("group")
         .filter(author=author)
-        .order_by("-pub_date")
-        .all()
     )
-    paginator = Paginator(post_list, 10)
-
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    profile = profile_for(author)
+    paginator = WindowedPaginator(post_list, 10, count=profile.posts_count)
+    page = paginator.get_page(request.GET.get("cursor"))
     return render(
         request,
         "profile.html",
@@ -75,26 +125,25 @@ def profile(request, username):
             "author": author,
             "page": page,
             "paginator": paginator,
-            "followers": followers_as_users,
+            "profile": profile,
+            "following": is_following(request.user, author),
+            "suggestions": (
+                recommendations.suggestions_for(author)
+                if request.user == author
+                else []
+            ),
+            "cache_version": feed_cache.versions(
+                feed_cache.author_scope(author.id)
+            ),
         },
     )
 
 
+@use_replica
+@condition(etag_func=conditional.post_etag)
 def post_view(request, username, post_id):
     author = get_object_or_404(User, username=username)
     post = get_object_or_404(Post, author=author, id=post_id)
-    comments = (
-        Comment.objects.select_related("author")
-        .select_related("post")
-        .filter(post=post)
-        .order_by("-created")
-        .all()
-    )
-
-    author_followers = author.following.all()
-    followers_as_users = []
-    for follower in author_followers:
-        followers_as_users.append(follower.user)
 
     form = CommentForm()
     return render(
@@ -103,13 +152,50 @@ def post_view(request, username, post_id):
         {
             "author": author,
             "post": post,
-            "followers": followers_as_users,
+            "profile": profile_for(author),
+            "following": is_following(request.user, author),
             "form": form,
-            "comments": comments,
+            "comments": comment_page(request, post),
         },
     )
 
 
+@use_replica
+@condition(etag_func=conditional.post_etag)
+def post_comments(request, username, post_id):
+    """
+    The next batch of comments of a post, loaded by the post page.
+    """
+    post = get_object_or_404(
+        Post.objects.select_related("author"),
+        author__username=username,
+        id=post_id,
+    )
+    return render(
+        request,
+        "comment_list.html",
+        {"post": post, "comments": comment_page(request, post)},
+    )
+
+
+def comment_page(request, post):
+    comments = Comment.objects.select_related("author").filter(post=post)
+    paginator = CursorPaginator(
+        comments, settings.COMMENTS_PAGE_SIZE, keys=("created", "id")
+    )
+    return paginator.get_page(request.GET.get("cursor"))
+
+
+def is_following(user, author):
+    """
+    Checks whether `user` is subscribed to `author`
+    with a single lookup on the (user, author) unique index.
+    """
+    if not user.is_authenticated:
+        return False
+    return Follow.objects.filter(user=user, author=author).exists()
+
+
 @login_required
 def post_edit(request, username, post_id):
     author = get_object_or_404(User, username=username)
@@ -124,6 +210,8 @@ def post_edit(request, username, post_id):
     if request.method == "POST":
         if form.is_valid():
             form.save()
+            if "image" in form.changed_data:
+                thumbnails.enqueue(post)
             return redirect("post", username=username, post_id=post_id)
 
     return render(request, "new_post.html", {"form": form, "post": post})
@@ -138,6 +226,8 @@ def new_post(request):
             unsaved_post = form.save(commit=False)
             unsaved_post.author = request.user
             unsaved_post.save()
+            thumbnails.enqueue(unsaved_post)
+            trending.record_post(unsaved_post)
             return redirect("index")
 
     return render(request, "new_post.html", {"form": form})
@@ -153,32 +243,91 @@ def add_comment(request, username, post_id):
             unsaved_comment = form.save(commit=False)
             unsaved_comment.post = post
             unsaved_comment.author = request.user
-            unsaved_comment.save()
+            # The comment and its post's counter are saved together
+            with transaction.atomic():
+                unsaved_comment.save()
+            trending.record_comment(unsaved_comment)
 
     return redirect("post", username=username, post_id=post_id)
 
 
-@login_required
-def follow_index(request):
-    following = request.user.follower.all()
-    following_users = []
-    for follow in following:
-        following_users.append(follow.author)
-
-    post_list = (
+@use_replica
+def trending_posts(request):
+    ids = trending.top_post_ids()
+    posts = (
         Post.objects.select_related("author")
         .select_related("group")
-        .filter(author__in=following_users)
-        .order_by("-pub_date")
-        .all()
+        .in_bulk(ids)
+    )
+    # Posts deleted since the list was cached are skipped
+    return render(
+        request,
+        "trending.html",
+        {"posts": [posts[pk] for pk in ids if pk in posts]},
+    )
+
+
+@use_replica
+@login_required
+@condition(etag_func=conditional.follow_etag)
+def follow_index(request):
+    paginator = TimelinePaginator(request.user, 10)
+    page = paginator.get_page(request.GET.get("cursor"))
+    cache_version = feed_cache.versions(
+        feed_cache.follower_scope(request.user.id),
+        *map(feed_cache.author_scope, paginator.exempt_authors),
+    )
+    return render(
+        request,
+        "follow.html",
+        {
+            "page": page,
+            "paginator": paginator,
+            "cache_version": cache_version,
+            "suggestions": recommendations.suggestions_for(request.user),
+        },
     )
-    paginator = Paginator(post_list, 10)
 
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
 
+@use_replica
+def search_results(request):
+    query = request.GET.get("q", "").strip()
+    try:
+        number = int(request.GET.get("page", 1))
+    except ValueError:
+        number = 1
+    number = min(max(number, 1), settings.SEARCH_MAX_PAGES)
+
+    posts, comments, has_next = [], [], False
+    if query:
+        size = settings.SEARCH_PAGE_SIZE
+        # One extra row tells whether there is a next page without COUNT(*)
+        posts = search.find(
+            Post.objects.select_related("author").select_related("group"),
+            query,
+            limit=size + 1,
+            offset=(number - 1) * size,
+        )
+        has_next = len(posts) > size and number < settings.SEARCH_MAX_PAGES
+        posts = posts[:size]
+        if number == 1:
+            comments = search.find(
+                Comment.objects.select_related("author").select_related(
+                    "post__author"
+                ),
+                query,
+                limit=size,
+            )
     return render(
-        request, "follow.html", {"page": page, "paginator": paginator}
+        request,
+        "search.html",
+        {
+            "query": query,
+            "posts": posts,
+            "comments": comments,
+            "number": number,
+            "has_next": has_next,
+        },
     )
 
 
@@ -1,10 +1,33 @@
+import re
+
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.urls import get_resolver
 
 
 User = get_user_model()
 
 
+def reserved_usernames(patterns=None):
+    """
+    Returns the first path segments of the routes, which would
+    shadow the profile page of a user with the same name.
+    """
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    names = set()
+    for pattern in patterns:
+        route = str(pattern.pattern).lstrip("^")
+        segment = re.match(r"[\w.@+-]*", route).group()
+        if segment:
+            names.add(segment.lower())
+        elif hasattr(pattern, "url_patterns"):
+            # An include without a prefix, like the posts routes
+            names.update(reserved_usernames(pattern.url_patterns))
+    return names
+
+
 # создадим собственный класс для формы регистрации
 # сделаем его наследником предустановленного класса UserCreationForm
 class CreationForm(UserCreationForm):
@@ -13,3 +36,9 @@ class CreationForm(UserCreationForm):
         model = User
         # укажем, какие поля должны быть видны в форме и в каком порядке
         fields = ("first_name", "last_name", "username", "email")
+
+    def clean_username(self):
+        username = self.cleaned_data["username"]
+        if username.lower() in reserved_usernames():
+            raise ValidationError("Это имя пользователя занято.")
+        return username
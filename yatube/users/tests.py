@@ -1,3 +1,20 @@
 from django.test import TestCase
 
-# Create your tests here.
+from .forms import CreationForm
+
+
+class TestCreationForm(TestCase):
+    def form(self, username):
+        return CreationForm(
+            {
+                "username": username,
+                "email": "user@yandex.ru",
+                "password1": "Quite-long-password-42",
+                "password2": "Quite-long-password-42",
+            }
+        )
+
+    def test_route_names_are_reserved(self):
+        for username in ("groups", "Trending", "search", "admin", "new"):
+            self.assertIn("username", self.form(username).errors, username)
+        self.assertTrue(self.form("groupie").is_valid())
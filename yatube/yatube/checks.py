@@ -0,0 +1,154 @@
+"""
+Deployment checks of the settings on the hot path of every request.
+
+They are run by `manage.py check_performance`, or together with the
+other deployment checks by `manage.py check --deploy`.
+"""
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestFilesMixin
+from django.core.checks import Warning, register
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.utils.module_loading import import_string
+
+TAG = "performance"
+
+CACHED_LOADER = "django.template.loaders.cached.Loader"
+STOCK_SQLITE = "django.db.backends.sqlite3"
+FAST_SESSION_ENGINES = {
+    "django.contrib.sessions.backends.cache",
+    "django.contrib.sessions.backends.cached_db",
+    "django.contrib.sessions.backends.signed_cookies",
+}
+LOCAL_CACHES = {
+    "django.core.cache.backends.dummy.DummyCache",
+    "django.core.cache.backends.filebased.FileBasedCache",
+    "django.core.cache.backends.locmem.LocMemCache",
+}
+
+
+@register(TAG, deploy=True)
+def check_debug(app_configs, **kwargs):
+    if not settings.DEBUG:
+        return []
+    return [
+        Warning(
+            "DEBUG is on: every SQL query is kept in memory "
+            "and templates are not cached.",
+            id="performance.W001",
+        )
+    ]
+
+
+@register(TAG, deploy=True)
+def check_databases(app_configs, **kwargs):
+    warnings = []
+    for alias, database in settings.DATABASES.items():
+        max_age = database.get("CONN_MAX_AGE", 0)
+        if max_age == 0:
+            warnings.append(
+                Warning(
+                    f"Database {alias!r} is connected to on every request.",
+                    hint="Set CONN_MAX_AGE to keep connections open.",
+                    id="performance.W002",
+                )
+            )
+        elif not database.get("CONN_HEALTH_CHECKS", False):
+            warnings.append(
+                Warning(
+                    f"Persistent connections of database {alias!r} "
+                    "are reused without being checked.",
+                    hint="Set CONN_HEALTH_CHECKS to True.",
+                    id="performance.W003",
+                )
+            )
+        if database.get("ENGINE") == STOCK_SQLITE:
+            warnings.append(
+                Warning(
+                    f"Database {alias!r} uses SQLite without pragmas, "
+                    "its readers and writer block each other.",
+                    hint="Use the 'yatube.sqlite3' engine.",
+                    id="performance.W004",
+                )
+            )
+    return warnings
+
+
+def _loader_name(loader):
+    return loader[0] if isinstance(loader, (list, tuple)) else loader
+
+
+@register(TAG, deploy=True)
+def check_template_loaders(app_configs, **kwargs):
+    warnings = []
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        loaders = [_loader_name(loader) for loader in engine.engine.loaders]
+        if CACHED_LOADER not in loaders:
+            warnings.append(
+                Warning(
+                    f"Templates of engine {engine.name!r} are "
+                    "compiled again every time they are rendered.",
+                    hint=f"Wrap the loaders in {CACHED_LOADER!r}.",
+                    id="performance.W005",
+                )
+            )
+    return warnings
+
+
+@register(TAG, deploy=True)
+def check_sessions(app_configs, **kwargs):
+    if settings.SESSION_ENGINE in FAST_SESSION_ENGINES:
+        return []
+    return [
+        Warning(
+            f"Sessions are stored by {settings.SESSION_ENGINE!r}, "
+            "which reads the database on every request.",
+            hint="Use the cache or signed_cookies session engine.",
+            id="performance.W006",
+        )
+    ]
+
+
+@register(TAG, deploy=True)
+def check_caches(app_configs, **kwargs):
+    return [
+        Warning(
+            f"Cache {alias!r} is not shared between the servers.",
+            hint="Use memcached or another network cache.",
+            id="performance.W007",
+        )
+        for alias, cache in settings.CACHES.items()
+        if cache["BACKEND"] in LOCAL_CACHES
+    ]
+
+
+@register(TAG, deploy=True)
+def check_static_storage(app_configs, **kwargs):
+    storage = import_string(settings.STATICFILES_STORAGE)
+    if issubclass(storage, ManifestFilesMixin):
+        return []
+    return [
+        Warning(
+            "Static file names carry no content hash, "
+            "so browsers cannot cache them for long.",
+            hint="Use ManifestStaticFilesStorage.",
+            id="performance.W008",
+        )
+    ]
+
+
+@register(TAG, deploy=True)
+def check_static_pipeline(app_configs, **kwargs):
+    if settings.STATIC_PIPELINE_SERVE:
+        return []
+    return [
+        Warning(
+            "Static files are not served precompressed "
+            "with immutable cache headers.",
+            hint="Run build_static and set STATIC_PIPELINE_SERVE to True.",
+            id="performance.W009",
+        )
+    ]
@@ -0,0 +1,164 @@
+"""
+Serving of the uploaded media files.
+
+Whole files are sent with `FileResponse`, which servers hand to
+`wsgi.file_wrapper` and so to `sendfile()`. A single byte range is read
+and sent in chunks of `CHUNK_SIZE`, so large originals never sit in
+memory. With `MEDIA_ACCEL_REDIRECT` set, only the headers are written
+here and nginx sends the file from its internal location, ranges
+included.
+
+Validators come from the file status and are checked before the file
+is opened. Thumbnails are named after a hash of their source and
+options, so their URLs are cached as immutable.
+"""
+
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+from .static import CHUNK_SIZE, IMMUTABLE, REVALIDATE
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class UnsatisfiableRange(Exception):
+    pass
+
+
+def byte_range(header, size):
+    """
+    Returns `(start, end)`, end excluded, of the single range asked
+    by a `Range` header, or None when the whole file is to be sent.
+    Raises `UnsatisfiableRange` for a range past the end of the file.
+    """
+    match = RANGE_RE.match(header.replace(" ", ""))
+    # Several ranges and other units are answered with the whole file
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+        if last and int(last) < start:
+            return None
+    elif last:
+        start, end = max(size - int(last), 0), size
+    else:
+        return None
+    if start >= end:
+        raise UnsatisfiableRange(header)
+    return start, end
+
+
+def cache_control(name):
+    if name.startswith(thumbnail_settings.THUMBNAIL_PREFIX):
+        return IMMUTABLE
+    return REVALIDATE
+
+
+def _path(name):
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+        status = os.stat(path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404("No such media file")
+    if not stat.S_ISREG(status.st_mode):
+        raise Http404("No such media file")
+    return path, status
+
+
+def _read(source, start, end):
+    with source:
+        source.seek(start)
+        remaining = end - start
+        while remaining:
+            chunk = source.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _range_applies(request, etag, last_modified):
+    # A range of a file that has changed since would not fit
+    # the parts the client already has
+    if_range = request.META.get("HTTP_IF_RANGE")
+    return if_range is None or if_range in (etag, last_modified)
+
+
+@require_safe
+def serve(request, path):
+    name = posixpath.normpath(path).lstrip("/")
+    full_path, status = _path(name)
+    size = status.st_size
+    etag = '"%x-%x"' % (status.st_mtime_ns, size)
+    last_modified = http_date(status.st_mtime)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": cache_control(name),
+    }
+    if not settings.MEDIA_ACCEL_REDIRECT:
+        headers["Accept-Ranges"] = "bytes"
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(status.st_mtime)
+    )
+    if response is None:
+        content_type = mimetypes.guess_type(name)[0]
+        content_type = content_type or "application/octet-stream"
+        response = _file_response(
+            request, full_path, name, size, content_type, etag, last_modified
+        )
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def _file_response(
+    request, full_path, name, size, content_type, etag, last_modified
+):
+    if settings.MEDIA_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        location = settings.MEDIA_ACCEL_REDIRECT + quote(name)
+        response["X-Accel-Redirect"] = location
+        return response
+
+    header = request.META.get("HTTP_RANGE")
+    if header and _range_applies(request, etag, last_modified):
+        try:
+            requested = byte_range(header, size)
+        except UnsatisfiableRange:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        if requested is not None:
+            start, end = requested
+            response = StreamingHttpResponse(
+                _read(open(full_path, "rb"), start, end),
+                status=206,
+                content_type=content_type,
+            )
+            response["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+            response["Content-Length"] = str(end - start)
+            return response
+
+    return FileResponse(open(full_path, "rb"), content_type=content_type)
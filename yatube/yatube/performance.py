@@ -0,0 +1,311 @@
+"""
+Per-request performance instrumentation.
+
+`PerformanceMiddleware` measures SQL queries, cache calls, template
+rendering and `sorl.thumbnail` for every request, and reports them
+in a `Server-Timing` header and a JSON line of the
+`yatube.performance` logger. Slow requests can be profiled with
+cProfile, a sample of them is dumped to `PERFORMANCE_PROFILE_DIR`.
+
+Template and thumbnail timings need the timed classes of this module
+to be configured in `TEMPLATES` and `THUMBNAIL_BACKEND`/`THUMBNAIL_KVSTORE`.
+"""
+
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+
+logger = logging.getLogger("yatube.performance")
+
+_local = threading.local()
+_MISSING = object()
+
+IN_LIST_RE = re.compile(r"\((?:%s, )+%s\)")
+SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """
+    Makes statements differing only in the length
+    of their `IN (...)` lists look the same.
+    """
+    return SPACE_RE.sub(" ", IN_LIST_RE.sub("(...)", sql)).strip()
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_sets = 0
+        self.timings = defaultdict(float)
+        self.depth = defaultdict(int)
+        self.duration = None
+
+    @contextmanager
+    def timing(self, name):
+        """
+        Adds the time spent in the block to `timings[name]`.
+        Nested blocks of the same name are counted once.
+        """
+        self.depth[name] += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.depth[name] -= 1
+            if not self.depth[name]:
+                self.timings[name] += time.perf_counter() - started
+
+    def __call__(self, execute, sql, params, many, context):
+        # The database execute wrapper
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started
+
+    @property
+    def sql_seconds(self):
+        return sum(seconds for _, seconds in self.queries)
+
+    def slowest_queries(self, limit):
+        grouped = defaultdict(lambda: [0, 0.0])
+        for sql, seconds in self.queries:
+            statement = grouped[normalize_sql(sql)]
+            statement[0] += 1
+            statement[1] += seconds
+        slowest = sorted(grouped.items(), key=lambda item: -item[1][1])
+        return [
+            {"sql": sql, "count": count, "ms": round(seconds * 1000, 2)}
+            for sql, (count, seconds) in slowest[:limit]
+        ]
+
+
+def current():
+    """
+    Returns the stats of the request being processed by this thread.
+    """
+    return getattr(_local, "stats", None)
+
+
+@contextmanager
+def timing(name):
+    stats = current()
+    if stats is None:
+        yield
+        return
+    with stats.timing(name):
+        yield
+
+
+def _counted(method, count):
+    """
+    Wraps a cache method so that the outermost call is counted,
+    backends implement `get_many` on top of `get` and so on.
+    """
+
+    def wrapper(*args, **kwargs):
+        stats = current()
+        if stats is None or stats.depth["cache"]:
+            return method(*args, **kwargs)
+        with stats.timing("cache"):
+            result = method(*args, **kwargs)
+        count(stats, result, *args, **kwargs)
+        return result
+
+    return wrapper
+
+
+def instrument_cache(cache):
+    if getattr(cache, "_performance_instrumented", False):
+        return
+    get = cache.get
+
+    def counted_get(key, default=None, version=None):
+        stats = current()
+        if stats is None or stats.depth["cache"]:
+            return get(key, default, version)
+        with stats.timing("cache"):
+            value = get(key, _MISSING, version)
+        if value is _MISSING:
+            stats.cache_misses += 1
+            return default
+        stats.cache_hits += 1
+        return value
+
+    def count_get_many(stats, result, keys, *args, **kwargs):
+        keys = list(keys)
+        stats.cache_hits += len(result)
+        stats.cache_misses += len(keys) - len(result)
+
+    def count_set(stats, result, *args, **kwargs):
+        stats.cache_sets += 1
+
+    def count_set_many(stats, result, data, *args, **kwargs):
+        stats.cache_sets += len(data)
+
+    cache.get = counted_get
+    cache.get_many = _counted(cache.get_many, count_get_many)
+    cache.set = _counted(cache.set, count_set)
+    cache.add = _counted(cache.add, count_set)
+    cache.set_many = _counted(cache.set_many, count_set_many)
+    cache._performance_instrumented = True
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Cache handlers are per thread, and so are their instruments.
+        for alias in settings.CACHES:
+            instrument_cache(caches[alias])
+
+        stats = _local.stats = RequestStats()
+        profiler = None
+        if settings.PERFORMANCE_PROFILE_DIR and (
+            random.random() < settings.PERFORMANCE_PROFILE_SAMPLE_RATE
+        ):
+            profiler = cProfile.Profile()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            _local.stats = None
+            stats.stop()
+
+        view_name = None
+        if request.resolver_match is not None:
+            view_name = request.resolver_match.view_name
+        if settings.PERFORMANCE_SERVER_TIMING:
+            response["Server-Timing"] = self.server_timing(stats)
+        if logger.isEnabledFor(logging.INFO):
+            record = self.record(request, response, view_name, stats)
+            logger.info(json.dumps(record, ensure_ascii=False))
+        if (
+            profiler is not None
+            and stats.duration * 1000
+            > settings.PERFORMANCE_PROFILE_THRESHOLD_MS
+        ):
+            self.dump(profiler, view_name)
+        return response
+
+    def record(self, request, response, view_name, stats):
+        cache_reads = stats.cache_hits + stats.cache_misses
+        return {
+            "view": view_name,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(stats.duration * 1000, 2),
+            "sql_count": len(stats.queries),
+            "sql_ms": round(stats.sql_seconds * 1000, 2),
+            "slowest_sql": stats.slowest_queries(
+                settings.PERFORMANCE_TOP_QUERIES
+            ),
+            "cache_hits": stats.cache_hits,
+            "cache_misses": stats.cache_misses,
+            "cache_sets": stats.cache_sets,
+            "cache_hit_ratio": (
+                round(stats.cache_hits / cache_reads, 3)
+                if cache_reads
+                else None
+            ),
+            "template_ms": round(stats.timings["template"] * 1000, 2),
+            "thumbnail_ms": round(stats.timings["thumbnail"] * 1000, 2),
+        }
+
+    def server_timing(self, stats):
+        cache_reads = stats.cache_hits + stats.cache_misses
+        metrics = [
+            f"sql;dur={stats.sql_seconds * 1000:.2f};"
+            f'desc="{len(stats.queries)} queries"',
+            f'cache;dur={stats.timings["cache"] * 1000:.2f};'
+            f'desc="{stats.cache_hits} of {cache_reads} hit"',
+            f'template;dur={stats.timings["template"] * 1000:.2f}',
+            f'thumbnail;dur={stats.timings["thumbnail"] * 1000:.2f}',
+            f"total;dur={stats.duration * 1000:.2f}",
+        ]
+        return ", ".join(metrics)
+
+    def dump(self, profiler, view_name):
+        os.makedirs(settings.PERFORMANCE_PROFILE_DIR, exist_ok=True)
+        name = "%s-%s-%s.prof" % (
+            time.strftime("%Y%m%d-%H%M%S"),
+            (view_name or "unresolved").replace(":", "-"),
+            os.getpid(),
+        )
+        profiler.dump_stats(
+            os.path.join(settings.PERFORMANCE_PROFILE_DIR, name)
+        )
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with timing("template"):
+            return self.template.render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Django template backend measuring the time spent rendering.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class TimedThumbnailBackend(ThumbnailBackend):
+    def get_thumbnail(self, *args, **kwargs):
+        with timing("thumbnail"):
+            return super().get_thumbnail(*args, **kwargs)
+
+
+class TimedKVStore(KVStore):
+    """
+    Thumbnail lookups of the templates only touch the key-value store.
+    """
+
+    def get(self, *args, **kwargs):
+        with timing("thumbnail"):
+            return super().get(*args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        with timing("thumbnail"):
+            return super().set(*args, **kwargs)
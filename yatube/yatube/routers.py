@@ -0,0 +1,90 @@
+"""
+Read replica routing.
+
+Views decorated with `use_replica` read from a random alias
+of `DATABASE_REPLICAS`, everything else uses `default`. Once a request
+writes, `ReplicaPinMiddleware` pins its user to `default` for
+`REPLICA_PIN_SECONDS` with a cookie, so they read their own writes
+while the replicas catch up.
+"""
+
+import functools
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+def use_replica(view):
+    """
+    Lets the reads of a read-only view go to a replica.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_state, "replica_allowed", False)
+        _state.replica_allowed = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _state.replica_allowed = previous
+
+    return wrapper
+
+
+def replica_used():
+    """
+    Tells whether the current request has read from a replica.
+    """
+    return getattr(_state, "replica_used", False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            not settings.DATABASE_REPLICAS
+            or not getattr(_state, "replica_allowed", False)
+            or getattr(_state, "pinned", False)
+            or getattr(_state, "wrote", False)
+            # Reads inside a transaction must see its writes
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        _state.replica_used = True
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+class ReplicaPinMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cookie = settings.REPLICA_PIN_COOKIE
+        _state.pinned = cookie in request.COOKIES
+        _state.wrote = False
+        _state.replica_used = False
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = _state.wrote
+            _state.pinned = _state.wrote = _state.replica_used = False
+        if wrote:
+            response.set_cookie(
+                cookie,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -51,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "yatube.performance.PerformanceMiddleware",
+    "yatube.routers.ReplicaPinMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -65,7 +67,7 @@ ROOT_URLCONF = "yatube.urls"
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "yatube.performance.TimedDjangoTemplates",
         "DIRS": [TEMPLATES_DIR],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -82,14 +84,26 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "yatube.wsgi.application"
 
+# A cache shared by all the worker processes of the machine.
 CACHES = {
-    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",}
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(BASE_DIR, "cache"),
+    }
 }
 
 TEST_CACHES = {
     "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache",}
 }
 
+# Feed fragments are invalidated by version bumps on writes,
+# the timeout only limits how long unused fragments are kept.
+FEED_CACHE_ALIAS = "default"
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+# Fragments rendered from a replica might have missed a write,
+# so they are kept for a short time only.
+FEED_CACHE_REPLICA_TIMEOUT = 30
+
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
@@ -97,9 +111,23 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
-    }
+    },
+    # A stand-in read replica for the routing tests. Nothing copies rows
+    # to it, so it is only read from when listed in DATABASE_REPLICAS.
+    # It lives in memory: commands run with these settings leave no file.
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    },
 }
 
+# Views decorated with yatube.routers.use_replica read from these aliases.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ["yatube.routers.ReplicaRouter"]
+# After a write, the user reads from the primary for this many seconds.
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_COOKIE = "pin_primary"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -139,9 +167,30 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
+# Written by build_static, see yatube.static.
+STATIC_PIPELINE_MANIFEST = "static-pipeline.json"
+# Whether yatube.wsgi serves STATIC_URL with yatube.static.
+STATIC_PIPELINE_SERVE = False
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# Internal nginx location aliasing MEDIA_ROOT, e.g. "/protected-media/".
+# When set, yatube.media answers with X-Accel-Redirect instead of
+# streaming the files itself.
+MEDIA_ACCEL_REDIRECT = None
+
+# Uploads bigger than this are streamed to a temporary file.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+
+# Post images, see posts.images
+# Uploads bigger than this many bytes or pixels are refused.
+POST_IMAGE_MAX_UPLOAD_SIZE = 25 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50_000_000
+# Stored images are shrunk to fit a square of this side
+# and re-encoded in this format.
+POST_IMAGE_MAX_DIMENSION = 1920
+POST_IMAGE_FORMAT = "WEBP"
+POST_IMAGE_QUALITY = 82
 
 # Login
 
@@ -155,3 +204,79 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 SITE_ID = 1
+
+# Home timeline
+# Authors with more followers than this are not fanned out on write,
+# their posts are merged into follow feeds on read instead.
+TIMELINE_FANOUT_LIMIT = 10000
+# How many of the newest author's posts are copied into
+# a follower's timeline when they subscribe.
+TIMELINE_BACKFILL_LIMIT = 1000
+# How long the list of fan-out-on-read authors is cached, in seconds.
+TIMELINE_FANOUT_EXEMPT_TIMEOUT = 300
+
+# Comments shown on a post page, and loaded per "more" click.
+COMMENTS_PAGE_SIZE = 20
+
+# Groups per page of the group directory.
+GROUPS_PAGE_SIZE = 20
+
+# "Who to follow", see posts.recommendations
+# How many suggestions are stored per user, and how many are shown.
+RECOMMENDATIONS_TOP_K = 20
+RECOMMENDATIONS_SHOWN = 5
+
+# Trending posts, see posts.trending
+# Seconds after which engagement counts half.
+TRENDING_HALF_LIFE = 6 * 60 * 60
+TRENDING_POST_WEIGHT = 1
+TRENDING_COMMENT_WEIGHT = 1
+# Posts shown, and how long their list is cached, in seconds.
+TRENDING_SIZE = 50
+TRENDING_CACHE_TIMEOUT = 60
+# decay_trending drops posts scoring less than this,
+# and keeps this many posts at most.
+TRENDING_MIN_SCORE = 0.05
+TRENDING_MAX_POSTS = 10000
+
+# Full-text search
+# Backend keeping the search index, see posts.search.
+SEARCH_BACKEND = "posts.search.SqliteFTSBackend"
+# Results per page of the public search, and how deep it may be paged.
+SEARCH_PAGE_SIZE = 10
+SEARCH_MAX_PAGES = 50
+# How many best matches an admin changelist search is limited to.
+SEARCH_ADMIN_LIMIT = 1000
+
+# Numbered feed pages
+# How many page links are shown on each side of the current page.
+PAGINATOR_WINDOW = 2
+# How long approximate feed sizes are cached, in seconds,
+# and how many rows are read at most to count one.
+APPROXIMATE_COUNT_TIMEOUT = 60 * 10
+APPROXIMATE_COUNT_LIMIT = 10000
+
+# Admin
+# Filtered changelists of large tables are counted up to this many rows,
+# see posts.admin.KeysetChangeList.
+ADMIN_COUNT_LIMIT = 10000
+
+# JSON API
+# Feed items per page, and how many a client may ask for with ?limit=.
+API_PAGE_SIZE = 10
+API_MAX_PAGE_SIZE = 500
+
+# Performance instrumentation, see yatube.performance
+# Whether timings are sent to clients in a Server-Timing header,
+# which shows SQL and cache timings to anyone: development only.
+PERFORMANCE_SERVER_TIMING = True
+# How many of the slowest SQL statements are logged per request.
+PERFORMANCE_TOP_QUERIES = 5
+# Where cProfile dumps of slow requests go, None disables profiling.
+PERFORMANCE_PROFILE_DIR = None
+# Share of requests run under the profiler, and how slow
+# a profiled request has to be for its dump to be kept.
+PERFORMANCE_PROFILE_SAMPLE_RATE = 0.01
+PERFORMANCE_PROFILE_THRESHOLD_MS = 500
+THUMBNAIL_BACKEND = "yatube.performance.TimedThumbnailBackend"
+THUMBNAIL_KVSTORE = "yatube.performance.TimedKVStore"
@@ -0,0 +1,98 @@
+"""
+Production settings, selected with
+DJANGO_SETTINGS_MODULE=yatube.settings_production.
+
+They override the development settings on the hot path of every
+request. Secrets and hosts come from the environment, and
+`manage.py check_performance` tells which of these settings are off.
+"""
+
+import copy
+import os
+
+from .settings import *  # noqa: F401, F403
+from .settings import BASE_DIR, TEMPLATES
+
+SECRET_KEY = os.environ["YATUBE_SECRET_KEY"]
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get("YATUBE_ALLOWED_HOSTS", "").split(",")
+
+# Database
+# Connections are kept for CONN_MAX_AGE seconds and checked before reuse,
+# see yatube.sqlite3 for the pragmas set on each of them.
+
+DATABASES = {
+    "default": {
+        "ENGINE": "yatube.sqlite3",
+        "NAME": os.environ.get(
+            "YATUBE_DATABASE", os.path.join(BASE_DIR, "db.sqlite3")
+        ),
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        # Seconds a writer waits for the lock before giving up.
+        "OPTIONS": {"timeout": 20},
+    },
+}
+
+# Cache shared by all the servers, it also keeps the fragment versions.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.memcached.MemcachedCache",
+        "LOCATION": os.environ.get(
+            "YATUBE_MEMCACHED", "127.0.0.1:11211"
+        ).split(","),
+        "TIMEOUT": 60 * 60,
+    }
+}
+
+# Sessions live in the signed cookie, they cost no query nor cache call.
+SESSION_ENGINE = "django.contrib.sessions.backends.signed_cookies"
+SESSION_COOKIE_SECURE = True
+CSRF_COOKIE_SECURE = True
+
+# Templates are compiled once per process.
+TEMPLATES = copy.deepcopy(TEMPLATES)
+TEMPLATES[0]["APP_DIRS"] = False
+TEMPLATES[0]["OPTIONS"]["loaders"] = [
+    (
+        "django.template.loaders.cached.Loader",
+        [
+            "django.template.loaders.filesystem.Loader",
+            "django.template.loaders.app_directories.Loader",
+        ],
+    ),
+]
+
+# Hashed file names, static files can be cached by browsers for a year.
+STATICFILES_STORAGE = (
+    "django.contrib.staticfiles.storage.ManifestStaticFilesStorage"
+)
+# Precompressed by build_static after collectstatic, served by yatube.wsgi.
+STATIC_PIPELINE_SERVE = True
+# Media files are sent by nginx from this internal location when set.
+MEDIA_ACCEL_REDIRECT = os.environ.get("YATUBE_MEDIA_ACCEL_REDIRECT")
+
+# Query counts and timings are not sent to clients, only logged.
+PERFORMANCE_SERVER_TIMING = False
+
+# The timings of every request go to the standard error as JSON lines.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"message": {"format": "%(message)s"}},
+    "handlers": {
+        "performance": {
+            "class": "logging.StreamHandler",
+            "formatter": "message",
+        },
+    },
+    "loggers": {
+        "yatube.performance": {
+            "handlers": ["performance"],
+            "level": os.environ.get("YATUBE_PERFORMANCE_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
+}
@@ -0,0 +1,67 @@
+"""
+SQLite backend for production use.
+
+Every new connection gets the `PRAGMAS` of its `DATABASES` entry,
+WAL journaling by default so readers do not block the writer.
+With `CONN_HEALTH_CHECKS`, a persistent connection is checked once per
+request before it is reused, and replaced if it does not work anymore.
+"""
+
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    # Safe with WAL: a power loss may only lose the last transactions.
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    # Negative sizes are in KiB.
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    health_check_done = False
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = self.settings_dict.get("PRAGMAS", DEFAULT_PRAGMAS)
+        for name, value in pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get("CONN_HEALTH_CHECKS", False)
+
+    def is_usable(self):
+        try:
+            self.connection.execute("SELECT 1")
+        except base.Database.Error:
+            return False
+        return True
+
+    def close_if_unusable_or_obsolete(self):
+        # Called when a request starts and finishes
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+            or self.in_atomic_block
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
@@ -0,0 +1,371 @@
+"""
+Precompressed static files.
+
+`build_static` runs after `collectstatic` with a manifest storage, which
+has already fingerprinted the files and rewritten the references between
+them. It checks that templates only refer to static files through
+`{% static %}`, which resolves the fingerprinted names, writes `.gz`
+and, when the `brotli` package is installed, `.br` variants of the text
+files in parallel, and lists every file with its variants in the
+`STATIC_PIPELINE_MANIFEST` of `STATIC_ROOT`. Tags naming files that
+were not collected are reported too, as they would fail to render.
+
+`StaticFilesApplication` serves `STATIC_URL` from that manifest in front
+of the Django application: the smallest variant the client accepts,
+with immutable cache headers for fingerprinted files. Without a manifest
+it logs a warning and serves the collected files uncompressed.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.http import parse_etags
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST_VERSION = 1
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".css",
+    ".eot",
+    ".html",
+    ".js",
+    ".json",
+    ".map",
+    ".otf",
+    ".svg",
+    ".ttf",
+    ".txt",
+    ".xml",
+}
+# Smaller files do not gain enough to be worth another file
+MIN_SIZE = 512
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=0, must-revalidate"
+
+CHUNK_SIZE = 64 * 1024
+
+STATIC_TAG_RE = re.compile(r"{%\s*static\s+[\"']([^\"']+)[\"']")
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineError(Exception):
+    pass
+
+
+def _gzip(data):
+    # No timestamp in the header, so builds are reproducible
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+ENCODINGS = {"gzip": (".gz", _gzip)}
+if brotli is not None:
+    ENCODINGS["br"] = (".br", _brotli)
+
+
+def template_dirs():
+    dirs = []
+    for engine in settings.TEMPLATES:
+        dirs.extend(engine.get("DIRS", []))
+    for app_config in apps.get_app_configs():
+        path = os.path.join(app_config.path, "templates")
+        if os.path.isdir(path):
+            dirs.append(path)
+    return dirs
+
+
+def _template_lines(dirs):
+    for directory in template_dirs() if dirs is None else dirs:
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                if not name.endswith((".html", ".txt", ".xml")):
+                    continue
+                path = os.path.join(root, name)
+                with open(path, encoding="utf-8") as template:
+                    for number, line in enumerate(template, 1):
+                        yield path, number, line
+
+
+def literal_references(dirs=None):
+    """
+    Returns `(path, line number, line)` of the template lines referring
+    to `STATIC_URL` directly, which would miss the fingerprinted names.
+    """
+    literal = re.compile(r"[\"'(]%s" % re.escape(settings.STATIC_URL))
+    return [
+        (path, number, line.strip())
+        for path, number, line in _template_lines(dirs)
+        if literal.search(line)
+    ]
+
+
+def unresolved_references(storage, dirs=None):
+    """
+    Returns `(path, line number, name)` of the `{% static %}` tags
+    naming a file missing from the manifest of `storage`, which
+    would fail to render.
+    """
+    names = storage.load_manifest()
+    return [
+        (path, number, name)
+        for path, number, line in _template_lines(dirs)
+        for name in STATIC_TAG_RE.findall(line)
+        if name not in names
+    ]
+
+
+def hashed_names(storage):
+    """
+    Returns the fingerprinted names of the manifest storage `storage`.
+    """
+    if not hasattr(storage, "load_manifest"):
+        raise PipelineError(
+            "STATICFILES_STORAGE has to be a manifest storage, "
+            "e.g. ManifestStaticFilesStorage"
+        )
+    names = storage.load_manifest()
+    if not names:
+        raise PipelineError(
+            f"{storage.manifest_name} is missing, run collectstatic first"
+        )
+    return set(names.values())
+
+
+def compressible(name):
+    return os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def _entry(root, name, immutable, compress=True):
+    """
+    Writes the variants of `name` smaller than the file itself,
+    unless `compress` is false, and returns its manifest entry.
+    """
+    path = os.path.join(root, name)
+    with open(path, "rb") as source:
+        data = source.read()
+    entry = {
+        "size": len(data),
+        "etag": '"%s"' % hashlib.md5(data).hexdigest(),
+        "immutable": immutable,
+        "encodings": {},
+    }
+    if not compress or len(data) < MIN_SIZE or not compressible(name):
+        return name, entry
+    for encoding, (suffix, encoder) in ENCODINGS.items():
+        compressed = encoder(data)
+        if len(compressed) >= len(data):
+            continue
+        with open(path + suffix, "wb") as variant:
+            variant.write(compressed)
+        entry["encodings"][encoding] = {
+            "name": name + suffix,
+            "size": len(compressed),
+        }
+    return name, entry
+
+
+def _collected_names(root, storage):
+    # Variants of a previous build are skipped, even those of
+    # an encoding not available anymore
+    suffixes = (".gz", ".br")
+    skipped = {
+        getattr(storage, "manifest_name", None),
+        settings.STATIC_PIPELINE_MANIFEST,
+    }
+    names = []
+    for directory, _, files in os.walk(root):
+        for file_name in files:
+            name = os.path.relpath(os.path.join(directory, file_name), root)
+            name = name.replace(os.sep, "/")
+            if not name.endswith(suffixes) and name not in skipped:
+                names.append(name)
+    return sorted(names)
+
+
+def build(storage, workers=None):
+    """
+    Compresses the files of `STATIC_ROOT` with `workers` threads,
+    then writes and returns the manifest.
+    """
+    hashed = hashed_names(storage)
+    root = settings.STATIC_ROOT
+    names = _collected_names(root, storage)
+
+    # zlib and brotli release the GIL while they compress
+    with ThreadPoolExecutor(workers or os.cpu_count()) as executor:
+        files = dict(
+            executor.map(
+                lambda name: _entry(root, name, name in hashed), names
+            )
+        )
+    manifest = {"version": MANIFEST_VERSION, "files": files}
+    path = os.path.join(root, settings.STATIC_PIPELINE_MANIFEST)
+    with open(path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+    return manifest
+
+
+def accepted_encodings(header):
+    """
+    Returns the content codings allowed by an `Accept-Encoding` header.
+    """
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def etag_matches(etag, header):
+    """
+    Whether an `If-None-Match` header matches `etag`,
+    with the weak comparison the header calls for.
+    """
+    tags = parse_etags(header)
+    if tags == ["*"]:
+        return True
+
+    def opaque(tag):
+        return tag[2:] if tag.startswith("W/") else tag
+
+    return opaque(etag) in {opaque(tag) for tag in tags}
+
+
+class StaticFilesApplication:
+    """
+    WSGI application serving `STATIC_URL` from the pipeline manifest
+    and passing every other request to `application`.
+
+    The manifest is read once, so files are served without touching
+    the file system for anything but their contents.
+    """
+
+    # Preferred first
+    ENCODING_ORDER = ("br", "gzip")
+
+    def __init__(self, application, root=None, manifest=None):
+        self.application = application
+        self.root = root or settings.STATIC_ROOT
+        self.prefix = settings.STATIC_URL
+        if manifest is None:
+            manifest = self._load_manifest()
+        self.files = manifest["files"]
+
+    def _load_manifest(self):
+        path = os.path.join(self.root, settings.STATIC_PIPELINE_MANIFEST)
+        try:
+            with open(path) as manifest_file:
+                return json.load(manifest_file)
+        except FileNotFoundError:
+            pass
+        # A deploy that skipped build_static still serves its files
+        logger.warning(
+            "%s is missing, static files are served uncompressed, "
+            "run build_static",
+            path,
+        )
+        try:
+            hashed = hashed_names(staticfiles_storage)
+        except PipelineError:
+            hashed = set()
+        files = dict(
+            _entry(self.root, name, name in hashed, compress=False)
+            for name in _collected_names(self.root, staticfiles_storage)
+        )
+        return {"version": MANIFEST_VERSION, "files": files}
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if not path.startswith(self.prefix):
+            return self.application(environ, start_response)
+        name = path[len(self.prefix) :]
+        entry = self.files.get(name)
+        if entry is None:
+            return self._respond(start_response, "404 Not Found", [])
+        if environ["REQUEST_METHOD"] not in ("GET", "HEAD"):
+            return self._respond(
+                start_response,
+                "405 Method Not Allowed",
+                [("Allow", "GET, HEAD")],
+            )
+
+        file_name, size, etag = name, entry["size"], entry["etag"]
+        encoding = None
+        accepted = accepted_encodings(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        for candidate in self.ENCODING_ORDER:
+            variant = entry["encodings"].get(candidate)
+            if variant is not None and candidate in accepted:
+                file_name, size = variant["name"], variant["size"]
+                # Every representation has its own validator
+                etag = '%s-%s"' % (etag[:-1], candidate)
+                encoding = candidate
+                break
+
+        headers = [
+            ("Cache-Control", IMMUTABLE if entry["immutable"] else REVALIDATE),
+            ("ETag", etag),
+        ]
+        if entry["encodings"]:
+            headers.append(("Vary", "Accept-Encoding"))
+        if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+        if if_none_match and etag_matches(etag, if_none_match):
+            # Only the validators and caching headers, no entity headers
+            start_response("304 Not Modified", headers)
+            return []
+
+        if encoding is not None:
+            headers.append(("Content-Encoding", encoding))
+        content_type, _ = mimetypes.guess_type(name)
+        headers.append(
+            ("Content-Type", content_type or "application/octet-stream")
+        )
+        headers.append(("Content-Length", str(size)))
+
+        start_response("200 OK", headers)
+        if environ["REQUEST_METHOD"] == "HEAD":
+            return []
+        source = open(os.path.join(self.root, file_name), "rb")
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if file_wrapper is not None:
+            return file_wrapper(source, CHUNK_SIZE)
+        return _chunks(source)
+
+    @staticmethod
+    def _respond(start_response, status, headers):
+        start_response(status, [*headers, ("Content-Length", "0")])
+        return []
+
+
+def _chunks(source):
+    with source:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
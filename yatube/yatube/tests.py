@@ -1,4 +1,23 @@
-from django.test import TestCase, Client
+import gzip
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import warnings
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings as django_settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.checks import run_checks
+from django.core.management import CommandError, call_command
+from django.db.utils import ConnectionHandler
+from django.http import FileResponse
+from django.test import TestCase, Client, override_settings
+
+from . import static
+from .static import StaticFilesApplication
 
 
 class CommonTest(TestCase):
@@ -12,3 +31,347 @@ class CommonTest(TestCase):
             404,
             "404 status code is expected when the page is not found",
         )
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "performance-tests",
+        }
+    }
+)
+class PerformanceMiddlewareTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def test_server_timing(self):
+        response = self.client.get("/")
+        metrics = [
+            metric.split(";")[0]
+            for metric in response["Server-Timing"].split(", ")
+        ]
+        self.assertEqual(
+            metrics, ["sql", "cache", "template", "thumbnail", "total"]
+        )
+
+    def test_log_record(self):
+        with self.assertLogs("yatube.performance", "INFO") as logs:
+            self.client.get("/")
+            self.client.get("/")
+        first, second = [
+            json.loads(line.split(":", 2)[2]) for line in logs.output
+        ]
+        self.assertEqual(first["view"], "index")
+        self.assertGreater(first["sql_count"], 0)
+        self.assertGreater(first["template_ms"], 0)
+        self.assertEqual(len(first["slowest_sql"]), min(first["sql_count"], 5))
+        self.assertGreater(first["cache_misses"], 0)
+        self.assertGreater(second["cache_hits"], first["cache_hits"])
+
+    def test_profile_dump(self):
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir)
+        with self.settings(
+            PERFORMANCE_PROFILE_DIR=profile_dir,
+            PERFORMANCE_PROFILE_SAMPLE_RATE=1,
+            PERFORMANCE_PROFILE_THRESHOLD_MS=0,
+        ):
+            self.client.get("/")
+        dumps = os.listdir(profile_dir)
+        self.assertEqual(len(dumps), 1)
+        self.assertIn("index", dumps[0])
+
+
+class ProductionSettingsTest(TestCase):
+    def warning_ids(self):
+        return {
+            warning.id
+            for warning in run_checks(
+                tags=["performance"], include_deployment_checks=True
+            )
+        }
+
+    def test_development_settings_are_warned(self):
+        ids = self.warning_ids()
+        for warning_id in ("W002", "W004", "W006", "W007", "W008", "W009"):
+            self.assertIn(f"performance.{warning_id}", ids)
+
+    def test_production_settings_pass(self):
+        with mock.patch.dict(os.environ, {"YATUBE_SECRET_KEY": "secret"}):
+            production = importlib.import_module("yatube.settings_production")
+        self.assertFalse(production.PERFORMANCE_SERVER_TIMING)
+        names = (
+            "DEBUG",
+            "DATABASES",
+            "CACHES",
+            "SESSION_ENGINE",
+            "TEMPLATES",
+            "STATICFILES_STORAGE",
+            "STATIC_PIPELINE_SERVE",
+        )
+        overrides = {name: getattr(production, name) for name in names}
+        with warnings.catch_warnings():
+            # Overriding DATABASES does not reconnect, checks only read it
+            warnings.simplefilter("ignore")
+            with self.settings(**overrides):
+                self.assertEqual(self.warning_ids(), set())
+
+    def connection(self, **settings_dict):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        handler = ConnectionHandler(
+            {
+                "default": {
+                    "ENGINE": "yatube.sqlite3",
+                    "NAME": os.path.join(directory, "db.sqlite3"),
+                    **settings_dict,
+                }
+            }
+        )
+        connection = handler["default"]
+        self.addCleanup(connection.close)
+        return connection
+
+    def test_pragmas(self):
+        connection = self.connection()
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
+            cursor.execute("PRAGMA synchronous")
+            # NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_health_check(self):
+        connection = self.connection(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+        connection.ensure_connection()
+        broken = connection.connection
+        broken.close()
+        # A new request starts
+        connection.close_if_unusable_or_obsolete()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        self.assertIsNot(connection.connection, broken)
+
+
+class StaticPipelineTest(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        # The templates of the project refer to files collected
+        # outside of the tests, so a page of its own is checked
+        templates = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, templates)
+        with open(os.path.join(templates, "page.html"), "w") as template:
+            template.write("{% load static %}\n")
+            template.write(
+                "<link href=\"{% static 'admin/css/base.css' %}\">\n"
+            )
+        settings = override_settings(
+            STATIC_ROOT=root,
+            STATICFILES_STORAGE=(
+                "django.contrib.staticfiles.storage."
+                "ManifestStaticFilesStorage"
+            ),
+            TEMPLATES=[{**django_settings.TEMPLATES[0], "DIRS": [templates]}],
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.root = root
+        self.templates = templates
+        call_command("collectstatic", interactive=False, verbosity=0)
+        call_command("build_static", stdout=StringIO(), stderr=StringIO())
+        self.application = StaticFilesApplication(self.not_static)
+        self.name = staticfiles_storage.stored_name("admin/css/base.css")
+
+    @staticmethod
+    def not_static(environ, start_response):
+        start_response("200 OK", [])
+        return [b"django"]
+
+    def get(self, path, **headers):
+        response = {}
+
+        def start_response(status, response_headers):
+            response["status"] = status
+            response["headers"] = dict(response_headers)
+
+        environ = {"REQUEST_METHOD": "GET", "PATH_INFO": path, **headers}
+        body = b"".join(self.application(environ, start_response))
+        return response["status"], response["headers"], body
+
+    def test_serves_precompressed_variant(self):
+        with open(os.path.join(self.root, self.name), "rb") as original:
+            content = original.read()
+        status, headers, body = self.get(
+            "/static/" + self.name, HTTP_ACCEPT_ENCODING="gzip, deflate"
+        )
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertIn("immutable", headers["Cache-Control"])
+        self.assertEqual(headers["Content-Type"], "text/css")
+        self.assertEqual(gzip.decompress(body), content)
+
+        status, headers, body = self.get(
+            "/static/" + self.name, HTTP_ACCEPT_ENCODING="gzip;q=0"
+        )
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(body, content)
+
+        etag = headers["ETag"]
+        for if_none_match in (etag, f'"other", W/{etag}', "*"):
+            status, not_modified, body = self.get(
+                "/static/" + self.name, HTTP_IF_NONE_MATCH=if_none_match
+            )
+            self.assertEqual(status, "304 Not Modified")
+            self.assertEqual(not_modified["ETag"], etag)
+            self.assertNotIn("Content-Length", not_modified)
+            self.assertEqual(body, b"")
+        status, _, _ = self.get(
+            "/static/" + self.name, HTTP_IF_NONE_MATCH='"other"'
+        )
+        self.assertEqual(status, "200 OK")
+
+    def test_unhashed_and_missing_files(self):
+        _, headers, _ = self.get("/static/admin/css/base.css")
+        self.assertNotIn("immutable", headers["Cache-Control"])
+        status, _, _ = self.get("/static/nothing.css")
+        self.assertEqual(status, "404 Not Found")
+        status, _, body = self.get("/group/")
+        self.assertEqual(body, b"django")
+
+    def test_missing_manifest_serves_uncompressed_files(self):
+        os.remove(os.path.join(self.root, "static-pipeline.json"))
+        with self.assertLogs("yatube.static", "WARNING"):
+            self.application = StaticFilesApplication(self.not_static)
+        status, headers, _ = self.get(
+            "/static/" + self.name, HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(status, "200 OK")
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertIn("immutable", headers["Cache-Control"])
+        status, _, _ = self.get("/static/" + self.name + ".gz")
+        self.assertEqual(status, "404 Not Found")
+
+    def test_literal_references_are_rejected(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, "page.html"), "w") as template:
+            template.write('<img src="/static/logo.png">\n')
+        self.assertEqual(
+            static.literal_references([directory]),
+            [
+                (
+                    os.path.join(directory, "page.html"),
+                    1,
+                    '<img src="/static/logo.png">',
+                )
+            ],
+        )
+        self.assertEqual(static.literal_references(), [])
+
+    def test_uncollected_references_are_rejected(self):
+        with open(os.path.join(self.templates, "page.html"), "a") as template:
+            template.write("<img src=\"{% static 'logo.png' %}\">\n")
+        self.assertEqual(
+            static.unresolved_references(staticfiles_storage),
+            [(os.path.join(self.templates, "page.html"), 3, "logo.png")],
+        )
+        with self.assertRaises(CommandError):
+            call_command("build_static", stdout=StringIO(), stderr=StringIO())
+
+
+class MediaServingTest(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = self.settings(MEDIA_ROOT=root, MEDIA_ACCEL_REDIRECT=None)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.content = bytes(range(256)) * 1024
+        os.makedirs(os.path.join(root, "posts"))
+        with open(os.path.join(root, "posts", "photo.webp"), "wb") as image:
+            image.write(self.content)
+        os.makedirs(os.path.join(root, "cache", "ab", "cd"))
+        thumbnail = os.path.join(root, "cache", "ab", "cd", "abcd.jpg")
+        with open(thumbnail, "wb") as image:
+            image.write(b"thumbnail")
+
+    @staticmethod
+    def body(response):
+        content = b"".join(response.streaming_content)
+        response.close()
+        return content
+
+    def test_whole_file_is_streamed(self):
+        response = self.client.get("/media/posts/photo.webp")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertEqual(response["Content-Length"], str(len(self.content)))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertNotIn("immutable", response["Cache-Control"])
+        self.assertEqual(self.body(response), self.content)
+
+        response = self.client.get("/media/cache/ab/cd/abcd.jpg")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.body(response)
+
+    def test_byte_ranges(self):
+        response = self.client.get(
+            "/media/posts/photo.webp", HTTP_RANGE="bytes=100-199"
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(
+            response["Content-Range"], f"bytes 100-199/{len(self.content)}"
+        )
+        self.assertEqual(self.body(response), self.content[100:200])
+
+        response = self.client.get(
+            "/media/posts/photo.webp", HTTP_RANGE="bytes=-10"
+        )
+        self.assertEqual(self.body(response), self.content[-10:])
+
+        response = self.client.get(
+            "/media/posts/photo.webp", HTTP_RANGE="bytes=999999999-"
+        )
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(
+            response["Content-Range"], f"bytes */{len(self.content)}"
+        )
+
+    def test_conditional_requests(self):
+        response = self.client.get("/media/posts/photo.webp")
+        self.body(response)
+        etag = response["ETag"]
+
+        response = self.client.get(
+            "/media/posts/photo.webp", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        # The file changed since the range was asked for
+        response = self.client.get(
+            "/media/posts/photo.webp",
+            HTTP_RANGE="bytes=0-9",
+            HTTP_IF_RANGE='"stale"',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+
+    def test_missing_files_and_offload(self):
+        for path in ("/media/posts/nothing.webp", "/media/posts/", "/media/"):
+            self.assertEqual(self.client.get(path).status_code, 404)
+        response = self.client.get("/media/../manage.py")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            self.client.post("/media/posts/photo.webp").status_code, 405
+        )
+
+        with self.settings(MEDIA_ACCEL_REDIRECT="/protected-media/"):
+            response = self.client.get("/media/posts/photo.webp")
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected-media/posts/photo.webp"
+        )
+        self.assertEqual(response.content, b"")
@@ -13,42 +13,59 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.contrib.flatpages import views
 from django.conf.urls import handler404, handler500
 
+from yatube import media
+from yatube.routers import use_replica
+
 handler404 = "posts.views.page_not_found"  # noqa
 handler500 = "posts.views.server_error"  # noqa
 
+flatpage = use_replica(views.flatpage)
+
 urlpatterns = [
-    path("about/", include("django.contrib.flatpages.urls")),
+    # What django.contrib.flatpages.urls routes, read from a replica
+    path(
+        "about/<path:url>",
+        flatpage,
+        name="django.contrib.flatpages.views.flatpage",
+    ),
     path("auth/", include("users.urls")),
     path("auth/", include("django.contrib.auth.urls")),
     path("admin/", admin.site.urls),
-    path("about-us/", views.flatpage, {"url": "/about-us/"}, name="about"),
-    path("terms/", views.flatpage, {"url": "/terms/"}, name="terms"),
+    path("about-us/", flatpage, {"url": "/about-us/"}, name="about"),
+    path("terms/", flatpage, {"url": "/terms/"}, name="terms"),
     path(
         "about-author/",
-        views.flatpage,
+        flatpage,
         {"url": "/about-author/"},
         name="about-author",
     ),
     path(
         "about-spec/",
-        views.flatpage,
+        flatpage,
         {"url": "/about-spec/"},
         name="about-spec",
     ),
+    path("api/v1/", include("posts.api_urls")),
+    # Served in production too, see yatube.media. Before the posts
+    # routes, whose <username>/ patterns would match media paths.
+    re_path(
+        r"^%s(?P<path>.*)$" % re.escape(settings.MEDIA_URL.lstrip("/")),
+        media.serve,
+        name="media",
+    ),
     path("", include("posts.urls")),
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
     urlpatterns += static(
         settings.STATIC_URL, document_root=settings.STATIC_ROOT
     )